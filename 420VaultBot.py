@@ -1,16 +1,48 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import asyncio
 import random
 import os
 import re
-from urllib.parse import urlparse # For cleaning up URLs for better search
+import math
+import time
+import heapq
+from collections import OrderedDict, Counter, deque
+import sys
+import copy
+import json
+import inspect
+import abc
+import threading
+import mmap
+import sqlite3
+import queue
+import uuid
+import hashlib
+import bisect
+import gzip
+import lzma
+import itertools
+import functools
+import contextlib
+import concurrent.futures
+from array import array
+from urllib.parse import urlparse, urlsplit, parse_qsl # For cleaning up URLs for better search
+
+try:
+    import zstandard # Optional: only needed for .zst compressed link lists (pip3 install zstandard)
+except ImportError:
+    zstandard = None
 
 # --- CONFIGURATION SECTION: Adjust these values to control your Intelligent Retriever! ---
 # This section allows you to customize the bot's behavior and target channels.
 
 # COMMAND PREFIX: The character your bot will listen for (e.g., "!", "#", ">").
 PREFIX = "#" 
+# SLASH COMMANDS ENABLED: Also offer /searchkit and /sendlink, with keyword, scope and channel autocomplete.
+# They are registered with Discord once per start (it can take a while before they show up the first time).
+SLASH_COMMANDS_ENABLED = True
 
 # BOT TOKEN: Your bot's secret key. Obtain this from the Discord Developer Portal.
 # IMPORTANT: DO NOT hardcode your token directly in publicly shared code for security.
@@ -20,6 +52,7 @@ BOT_TOKEN = "YOUR_BOT_TOKEN"
 # LINKS FILES: A LIST of text file names containing your harvested links.
 # Each file should contain one link per line, without category headers.
 # The bot will combine links from all these files.
+# Compressed lists ending in .gz, .xz or .zst (needs `pip3 install zstandard`) are read directly.
 LINKS_FILES = [
     "lists.txt",
     "lists_part_2.txt",
@@ -46,14 +79,135 @@ TARGET_CHANNEL_NAMES = [
     "🔓keygens"          # Note: Emojis and special characters are part of the name
 ]
 
-# MAX SEARCH RESULTS TO DISPLAY: How many matching links !searchkit should show in the Discord channel.
+# MAX SEARCH RESULTS TO DISPLAY: How many matching links !searchkit should show in the Discord channel (per page).
 MAX_SEARCH_RESULTS_DISPLAY = 25
 
+# RESULT PAGES: !searchkit keeps up to RESULT_CURSOR_MAX_RESULTS of the best matches, and the ◀️ / ▶️ / 🔀 buttons
+# under the results page through (or reshuffle) them without searching again.
+RESULT_CURSOR_MAX_RESULTS = 250
+# RESULT CURSOR TTL SECONDS: The buttons stop working after this long without being used (or after a reload).
+RESULT_CURSOR_TTL_SECONDS = 900
+# RESULT CURSOR MAX LINKS: How many links all open result pages may keep together (4 bytes each).
+# When there are more, the least recently used results expire first.
+RESULT_CURSOR_MAX_LINKS = 100000
+
+# SENDLINK MAX BULK: How many different links one sendlink may send at once, e.g. `#sendlink "serum win" my-channel 5`.
+SENDLINK_MAX_BULK = 10
+# SENDLINK MAX ROTATIONS: Sendlink goes through the matches of each (query, channel) in a random order, without
+# repeating a link until all of them were sent. How many of these rotations to remember (the oldest are forgotten).
+SENDLINK_MAX_ROTATIONS = 10000
+
+# SEARCH SELECTION POLICY: Which matches !searchkit shows when there are more than MAX_SEARCH_RESULTS_DISPLAY.
+# "weighted" = random sample where better-scoring links are more likely to show up (keeps results fresh),
+# "top" = always the best-scoring links.
+SEARCH_SELECTION_POLICY = "weighted"
+# SEARCH SAMPLING TEMPERATURE: For "weighted", how strongly the score matters. Lower = closer to "top",
+# higher = closer to a plain random sample.
+SEARCH_SAMPLING_TEMPERATURE = 2.0
+# SEARCH SAMPLE VARIANTS: For "weighted", how many different samples a query rotates through.
+# Each variant is cached separately, so repeated queries still vary without being searched again every time.
+SEARCH_SAMPLE_VARIANTS = 8
+
+# SEARCH EXECUTOR: Searches run off the Discord event loop so one big query can't freeze the bot.
+# "thread" runs them in a thread pool (low overhead), "process" in a process pool (uses more CPU cores,
+# each worker keeps its own copy of the link index).
+SEARCH_EXECUTOR = "thread"
+# SEARCH WORKERS: How many searches may run at the same time.
+SEARCH_WORKERS = 4
+# SEARCH TIMEOUT SECONDS: A search running longer than this is abandoned and the user is told to narrow it.
+SEARCH_TIMEOUT_SECONDS = 10
+# SEARCH SHARDS: If above 1, each search is split into this many shards (slices of the link IDs) that are
+# searched in parallel by a pool of worker processes, one CPU core each, and merged into the same results
+# a single search would give. Workers read the index straight from LINKS_SNAPSHOT_FILE (memory-mapped, so
+# they share it instead of copying it), so sharding needs a snapshot file, and appended links are saved to it right
+# away instead of every LINKS_SNAPSHOT_SAVE_INTERVAL_SECONDS. Worth it for vaults of millions of links.
+SEARCH_SHARDS = 0
+
+# SEARCH CACHE SIZE: How many recent search results to keep, so repeated queries skip the search entirely.
+# Set to 0 to disable the cache.
+SEARCH_CACHE_SIZE = 256
+# SEARCH CACHE TTL SECONDS: Cached results older than this are searched again.
+SEARCH_CACHE_TTL_SECONDS = 600
+
+# SEARCH ADMISSION: Limits that keep the bot responsive during bursts (e.g., right after a popular release).
+# Identical searches running at the same time are always done only once and shared.
+# SEARCH MAX PER USER: How many searches one user may have running or waiting at the same time.
+SEARCH_MAX_PER_USER = 2
+# SEARCH MAX PER GUILD: How many searches from one server may run at the same time (the rest wait in line).
+SEARCH_MAX_PER_GUILD = 4
+# SEARCH QUEUE SIZE: How many searches may wait in line in total. When the line is full,
+# new searches are turned away right away with a "busy, try again" message.
+SEARCH_QUEUE_SIZE = 32
+
+# LINKS WATCH INTERVAL SECONDS: If above 0, the bot checks LINKS_FILES this often and picks up any lines
+# appended to them automatically (no `#reloadlinks` needed). 0 disables the watcher.
+LINKS_WATCH_INTERVAL_SECONDS = 0
+
+# LINKS GROUP NEAR DUPLICATES: Links are always deduplicated by a canonical form of their URL (http/https,
+# 'www.', trailing slashes, #fragments and tracking parameters like ?utm_source= are ignored). If True, reposts of
+# the same release are also grouped: links that only differ by a trailing date/ID segment (e.g. audio.tools
+# '.../2024-03-01-1234') or a '-copy' / date slug suffix are indexed once, with the others kept as its variants.
+LINKS_GROUP_NEAR_DUPLICATES = False
+
+# LINKS SNAPSHOT FILE: The search index is saved ("compiled") to this file after every load, and memory-mapped
+# at startup instead of re-reading and re-indexing LINKS_FILES. It is rebuilt automatically when the list files
+# change. You can also build it ahead of time with: python3 420VaultBot.py --compile
+# Set to "" to disable snapshots.
+LINKS_SNAPSHOT_FILE = "links_index.snapshot"
+
+# LINKS SNAPSHOT SAVE INTERVAL SECONDS: Links appended to LINKS_FILES (picked up by the watcher or `#reloadlinks`) are
+# added to the snapshot file at most once per this many seconds, since every save rewrites the whole file. Until then they
+# are kept in memory on top of it (and read again from LINKS_FILES if the bot restarts). Full reloads are saved right away,
+# and so is everything with SEARCH_SHARDS > 1, since shard workers only search the snapshot file.
+LINKS_SNAPSHOT_SAVE_INTERVAL_SECONDS = 300
+
+# SEARCH BACKEND: Where the links are kept and searched.
+# "memory" = in RAM (fastest; the index is saved to LINKS_SNAPSHOT_FILE for quick restarts).
+# "sqlite" = in the SQLite database SQLITE_DATABASE_FILE on disk (with a full-text index), for vaults too big
+# for RAM (tens of millions of links): searches only read the parts of the database they need, and a restart
+# just reopens it. Gives the same results as "memory", only slower per search.
+SEARCH_BACKEND = "memory"
+SQLITE_DATABASE_FILE = "links_index.sqlite3"
+# SQLITE POOL SIZE: How many database connections are shared by the search threads and the bot's other lookups
+# (result pages, autocomplete, #status), which also run in background threads so a busy database never stalls the bot.
+# Keep it above SEARCH_WORKERS, so those lookups always have one left while searches run.
+SQLITE_POOL_SIZE = 5
+
+# PERF METRICS ENABLED: Record how long each step of the search commands takes (see `#perf`).
+# Costs almost nothing when False.
+PERF_METRICS_ENABLED = False
+# PERF EXPOSITION FILE: If set (and metrics are enabled), the latency histograms and counters are written to this
+# file in Prometheus text format every PERF_EXPOSITION_INTERVAL_SECONDS, for scraping by local monitoring tools.
+PERF_EXPOSITION_FILE = ""
+PERF_EXPOSITION_INTERVAL_SECONDS = 30
+
+# SEND RATE: Result messages are sent through one queue per channel that sends at most SEND_RATE_MESSAGES
+# messages every SEND_RATE_SECONDS to the same channel (Discord's per-channel limit is about 5 per 5 seconds),
+# so busy channels wait a moment instead of getting rate-limited.
+SEND_RATE_MESSAGES = 5
+SEND_RATE_SECONDS = 5
+# SEND MAX RETRIES: How many times a message is retried when Discord still says "rate limited" (with back-off).
+SEND_MAX_RETRIES = 3
+
 # --- GLOBAL VARIABLES & BOT INITIALIZATION: Do not modify below this point! ---
 # These are managed by the bot itself.
 
-all_loaded_links = [] # This list will hold all links loaded from ALL LINKS_FILES
+all_loaded_links = [] # link_index.records: the links from ALL LINKS_FILES, stored column-wise (LinkStore, OverlayLinkStore or SqliteLinkRecords)
+link_index = None # Search index over all_loaded_links (token + trigram postings); extended with appended links, rebuilt only on a full reload
+index_generation = 0 # Bumped every time link_index changes; cached search results from older generations are discarded
+link_ids_epoch = 0 # Bumped only when a full reload renumbers the links; result cursors from older epochs expire
+link_reloader = None # LinkReloader tracking what has been read from each of LINKS_FILES (created below)
+link_reload_lock = asyncio.Lock() # Serializes reloads (command, watcher and on_ready)
+links_watcher_task = None # Background task polling LINKS_FILES (only if LINKS_WATCH_INTERVAL_SECONDS > 0)
+perf_exposition_task = None # Background task writing PERF_EXPOSITION_FILE (only if configured)
+search_pool = None # Executor that runs searches (see SEARCH_EXECUTOR), created on first use
+search_pool_index = None # The LinkIndex the process pool workers were started with
+sharded_search = None # ShardedSearchEngine used when SEARCH_SHARDS > 1, created on first use
+keyword_suggester = None # KeywordSuggester over the current index's vocabulary, rebuilt after every reload
+snapshot_outdated_since = None # time.monotonic() when link_index first got links the saved snapshot doesn't have (None = saved)
+slash_commands_synced = False # True once the slash commands were registered with Discord
 # This dictionary will store resolved channel objects: {'lowercase_channel_name': <discord.TextChannel object>, ...}
+# It is kept up to date by channel_registry (see ChannelRegistry).
 resolved_target_channels = {} 
 
 intents = discord.Intents.default()
@@ -64,66 +218,2055 @@ intents.members = True # Required for resolving channel names reliably across gu
 
 bot = commands.Bot(command_prefix=PREFIX, intents=intents)
 
+# --- Search Vocabulary ---
+# Shared keyword tables used when links are loaded (to precompute per-link bitsets),
+# when a scope is inferred from a query, and when queries are filtered.
+
+# SCOPE KEYWORDS: A link belongs to a scope if its raw URL path contains any of these fragments.
+# The same table is used to infer a scope from the keywords when no `scope:` is given.
+SCOPE_KEYWORDS = {
+    "plugin": ["vst", "plugin", "au-aax"],
+    "preset": ["preset", "bank"],
+    "drumkit": ["drum-kit", "drumkit"],
+    "loops": ["loops"],
+    "midi": ["midi"],
+    "installer": ["installer", ".exe", ".dmg", ".pkg"],
+    "expansion": ["expansion"],
+    "crack": ["crack", "patch", "keygen"],
+    "tutorial": ["tutorial"],
+    "tool": ["tool"]
+}
+# CONTENT SCOPES: Searching one of these scopes always looks for CONTENT links, never CORE plugins.
+CONTENT_SCOPES = ["preset", "drumkit", "loops", "midi", "expansion", "crack"]
+
+# IDENTITY KEYWORDS: Links whose path contains any of these are CONTENT (expansions, presets, etc.), the rest are CORE.
+IDENTITY_KEYWORDS = ["preset", "bank", "expansion", "pack", "addon", "soundbank", "drumkit", "loop", "crack", "patch", "keygen"]
+
+# PLATFORM TERM FRAGMENTS: `#sendlink` terms with special meaning. The term matches when the raw path
+# contains ANY of its fragments (e.g., 'win' matches '.exe' links), instead of a plain cleaned-path match.
+PLATFORM_TERM_FRAGMENTS = {
+    "win": ["windows", ".exe", "installer-win", "win-installer", "for-windows"],
+    "mac": ["mac", "macos", ".dmg", ".pkg", "installer-mac", "for-mac"],
+    "installer": ["installer", ".exe", ".dmg", ".pkg", "setup"]
+}
+
+# Explicit `name:value` parameters understood by `#searchkit` (e.g., `scope:plugin`).
+SEARCH_PARAM_NAMES = ("scope", "os", "type", "format")
+
+# --- Performance Metrics ---
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (seconds). Percentiles are estimated as the upper bound of their bucket."""
+
+    # Bucket upper bounds in seconds (the last bucket catches everything slower)
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+    def __init__(self):
+        self.buckets = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float):
+        """Estimated latency (seconds) below which `fraction` of the observations fall."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.BOUNDS, self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+class PerfRegistry:
+    """In-process latency histograms (one per span name), counters and gauges. Safe to update from worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                self.histograms[name] = histogram = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name: str, value: float):
+        with self.lock:
+            self.gauges[name] = value
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def report_lines(self):
+        """Human-readable summary for `#perf`: one line per span, then counters and gauges."""
+        with self.lock:
+            lines = [f"{'span':<24}{'count':>8}{'avg':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"]
+            for name in sorted(self.histograms):
+                h = self.histograms[name]
+                lines.append(
+                    f"{name:<24}{h.count:>8}{h.total / h.count * 1000:>8.1f}ms{h.percentile(0.5) * 1000:>8.1f}ms"
+                    f"{h.percentile(0.9) * 1000:>8.1f}ms{h.percentile(0.99) * 1000:>8.1f}ms{h.max * 1000:>8.1f}ms"
+                )
+            for name in sorted(self.counters):
+                lines.append(f"{name:<24}{self.counters[name]:>8}")
+            for name in sorted(self.gauges):
+                lines.append(f"{name:<24}{self.gauges[name]:>8g}")
+        return lines
+
+    def exposition_text(self):
+        """All metrics in Prometheus text exposition format."""
+        with self.lock:
+            lines = ["# TYPE vaultbot_span_seconds histogram"]
+            for name in sorted(self.histograms):
+                h = self.histograms[name]
+                cumulative = 0
+                for bound, bucket_count in zip(LatencyHistogram.BOUNDS, h.buckets):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'vaultbot_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'vaultbot_span_seconds_sum{{span="{name}"}} {h.total:.6f}')
+                lines.append(f'vaultbot_span_seconds_count{{span="{name}"}} {h.count}')
+            lines.append("# TYPE vaultbot_events_total counter")
+            for name in sorted(self.counters):
+                lines.append(f'vaultbot_events_total{{event="{name}"}} {self.counters[name]}')
+            lines.append("# TYPE vaultbot_gauge gauge")
+            for name in sorted(self.gauges):
+                lines.append(f'vaultbot_gauge{{name="{name}"}} {self.gauges[name]:g}')
+        return "\n".join(lines) + "\n"
+
+perf_metrics = PerfRegistry()
+
+class _PerfSpan:
+    """Context manager timing one span into perf_metrics."""
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        perf_metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+_NO_SPAN = contextlib.nullcontext() # Shared do-nothing span used while metrics are disabled
+
+def perf_span(name: str):
+    """`with perf_span("name"):` times the block (no-op when PERF_METRICS_ENABLED is False)."""
+    return _PerfSpan(name) if PERF_METRICS_ENABLED else _NO_SPAN
+
+def perf_mark():
+    """Starts timing a step; pair with perf_lap(). Returns 0.0 without reading the clock when metrics are disabled."""
+    return time.perf_counter() if PERF_METRICS_ENABLED else 0.0
+
+def perf_lap(name: str, started: float):
+    """Records the time since `started` (from perf_mark/perf_lap) as span `name` and returns a new mark."""
+    if not PERF_METRICS_ENABLED:
+        return 0.0
+    now = time.perf_counter()
+    perf_metrics.observe(name, now - started)
+    return now
+
+def perf_count(name: str, amount: int = 1):
+    """Adds amount to counter `name` (no-op when metrics are disabled)."""
+    if PERF_METRICS_ENABLED:
+        perf_metrics.count(name, amount)
+
+def perf_timed(name: str):
+    """Decorator timing every call of a function or coroutine function as span `name`."""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                if not PERF_METRICS_ENABLED:
+                    return await function(*args, **kwargs)
+                with _PerfSpan(name):
+                    return await function(*args, **kwargs)
+            return timed_coroutine
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            if not PERF_METRICS_ENABLED:
+                return function(*args, **kwargs)
+            with _PerfSpan(name):
+                return function(*args, **kwargs)
+        return timed_function
+    return decorator
+
+async def write_perf_exposition():
+    """Background task: rewrites PERF_EXPOSITION_FILE every PERF_EXPOSITION_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(PERF_EXPOSITION_INTERVAL_SECONDS)
+        try:
+            perf_metrics.gauge("corpus_links", len(link_index) if link_index is not None else 0)
+            temp_path = f"{PERF_EXPOSITION_FILE}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(perf_metrics.exposition_text())
+            os.replace(temp_path, PERF_EXPOSITION_FILE)
+        except Exception as e:
+            print(f"ERROR: Failed to write performance metrics to '{PERF_EXPOSITION_FILE}': {e}")
+
+# --- Link Records ---
+
+class LinkRecord:
+    """
+    Everything the search commands need to know about a single link, computed once at load time.
+    Parsing URLs and running the cleaning regexes is the expensive part of a search, so it is
+    done here instead of on every query.
+    """
+    __slots__ = ("url", "raw_path", "clean_path", "tokens", "depth", "is_content")
+
+    def __init__(self, url: str):
+        self.url = url
+        # Full, lowercased path for broad matching (e.g., '/download-omnisphere-win/')
+        self.raw_path = urlparse(url).path.lower()
+        # Cleaned path with generic kit/platform words removed (see get_clean_url_path)
+        self.clean_path = get_clean_url_path(url)
+        self.tokens = self.clean_path.split()
+        # Number of path segments, used by ranking to prefer short (more specific) paths
+        self.depth = len(self.raw_path.split('/'))
+        # True for CONTENT links (presets, expansions, ...), False for CORE links (the main plugin)
+        self.is_content = any(x in self.raw_path for x in IDENTITY_KEYWORDS)
+
+    @classmethod
+    def from_fields(cls, url: str, raw_path: str, clean_path: str, depth: int, is_content: bool):
+        """Rebuilds a record from already computed fields (e.g., read from a compiled snapshot) without re-parsing."""
+        record = cls.__new__(cls)
+        record.url = url
+        record.raw_path = raw_path
+        record.clean_path = clean_path
+        record.tokens = clean_path.split()
+        record.depth = depth
+        record.is_content = is_content
+        return record
+
+    def __repr__(self):
+        return f"LinkRecord({self.url!r})"
+
+class LinkVariant:
+    """
+    A near-duplicate of an already loaded link (see LINKS_GROUP_NEAR_DUPLICATES): it is not indexed, only
+    attached to link_id. Loaders yield these between LinkRecords; LinkIndex stores them with LinkStore.add_variant.
+    """
+    __slots__ = ("link_id", "url")
+
+    def __init__(self, link_id: int, url: str):
+        self.link_id = link_id
+        self.url = url
+
+    def __repr__(self):
+        return f"LinkVariant({self.link_id}, {self.url!r})"
+
+def split_url_host(url: str):
+    """Splits url into its 'scheme://host' prefix and the rest (path, query, ...). Their concatenation is url."""
+    scheme_end = url.find("://")
+    path_start = url.find("/", scheme_end + 3) if scheme_end >= 0 else 0
+    if path_start < 0:
+        path_start = len(url)
+    return url[:path_start], url[path_start:]
+
+class StringArena:
+    """
+    Append-only sequence of strings stored as one contiguous UTF-8 buffer plus an array of end offsets,
+    instead of one Python str object each. The buffer is a bytearray, or a mapped snapshot file (then
+    `base` is where this arena starts in it). Searches run on the bytes in place with buffer.find(),
+    which for UTF-8 gives the same answer as a substring check on the decoded strings.
+    """
+    __slots__ = ("offsets", "buffer", "base")
+
+    def __init__(self, offsets=None, buffer=None, base: int = 0):
+        self.offsets = array('Q', [0]) if offsets is None else offsets
+        self.buffer = bytearray() if buffer is None else buffer
+        self.base = base
+
+    def append(self, value: str):
+        self.buffer += value.encode('utf-8')
+        self.offsets.append(len(self.buffer))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        return str(self.buffer[self.base + self.offsets[i]:self.base + self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def section_bytes(self, count: int):
+        """(u64 end offsets, UTF-8 arena) bytes of the first count strings, as stored in a snapshot."""
+        return self.offsets[:count + 1].tobytes(), bytes(self.buffer[self.base:self.base + self.offsets[count]])
+
+class LinkStore:
+    """
+    Column storage for the links of a LinkIndex, by link ID, built to keep million-link vaults small:
+    no Python object per link, just a few typed arrays and byte arenas.
+
+    - hosts: every distinct 'scheme://host' prefix once (e.g. 'https://audio.tools'); host_ids: array('I') per link
+    - url_suffixes: the rest of each URL; raw_paths / clean_paths: LinkRecord.raw_path / clean_path (StringArenas)
+    - depths: array('H') of path depths; content: packed bits (bit N set = link N is a CONTENT link)
+    - variants: link ID -> other URLs grouped with that link (see LinkVariant), for the few links that have any
+
+    Full URLs and LinkRecords are only rebuilt on access (url(), store[i]), i.e. for the few results shown.
+    Like the postings, the store is append-only and shared by every snapshot of an index.
+    """
+
+    def __init__(self, hosts: list = None, host_ids=None, url_suffixes: StringArena = None, raw_paths: StringArena = None,
+                 clean_paths: StringArena = None, depths=None, content=None, variants: dict = None):
+        self.hosts = [] if hosts is None else hosts
+        self.host_lookup = {host: host_id for host_id, host in enumerate(self.hosts)}
+        self.host_ids = array('I') if host_ids is None else host_ids
+        self.url_suffixes = StringArena() if url_suffixes is None else url_suffixes
+        self.raw_paths = StringArena() if raw_paths is None else raw_paths
+        self.clean_paths = StringArena() if clean_paths is None else clean_paths
+        self.depths = array('H') if depths is None else depths
+        self.content = bytearray() if content is None else content
+        self.variants = {} if variants is None else variants
+
+    def append(self, record: LinkRecord):
+        """Adds record's fields as the next link ID (the record itself is not kept)."""
+        link_id = len(self.depths)
+        host, suffix = split_url_host(record.url)
+        host_id = self.host_lookup.get(host)
+        if host_id is None:
+            host_id = self.host_lookup[host] = len(self.hosts)
+            self.hosts.append(host)
+        self.host_ids.append(host_id)
+        self.url_suffixes.append(suffix)
+        self.raw_paths.append(record.raw_path)
+        self.clean_paths.append(record.clean_path)
+        self.depths.append(min(record.depth, 0xFFFF))
+        if not link_id & 7:
+            self.content.append(0)
+        if record.is_content:
+            self.content[link_id >> 3] |= 1 << (link_id & 7)
+
+    def add_variant(self, variant: LinkVariant):
+        self.variants.setdefault(variant.link_id, []).append(variant.url)
+
+    def variant_urls(self, link_id: int):
+        """The other URLs grouped with link_id (empty for most links)."""
+        return self.variants.get(link_id, ())
+
+    def iter_variants(self, size: int = None):
+        """Yields a LinkVariant for every grouped URL (only those attached to link IDs below size, if given)."""
+        for link_id, urls in self.variants.items():
+            if size is None or link_id < size:
+                for url in urls:
+                    yield LinkVariant(link_id, url)
+
+    def variant_count(self, size: int = None):
+        return sum(len(urls) for link_id, urls in self.variants.items() if size is None or link_id < size)
+
+    def __len__(self):
+        return len(self.depths)
+
+    def url(self, link_id: int):
+        return self.hosts[self.host_ids[link_id]] + self.url_suffixes[link_id]
+
+    def urls(self, link_ids):
+        return [self.url(link_id) for link_id in link_ids]
+
+    def __getitem__(self, link_id: int):
+        return LinkRecord.from_fields(
+            self.url(link_id), self.raw_paths[link_id], self.clean_paths[link_id], self.depths[link_id],
+            bool(self.content[link_id >> 3] >> (link_id & 7) & 1)
+        )
+
+    def __iter__(self):
+        for link_id in range(len(self)):
+            yield self[link_id]
+
+    def iter_urls(self):
+        for link_id in range(len(self)):
+            yield self.url(link_id)
+
+    def layers(self):
+        """[(first link ID, LinkStore)] holding the links' columns: just this store (see OverlayLinkStore)."""
+        return [(0, self)]
+
+    def snapshot_sections(self, size: int):
+        """The columns of link IDs below size, as snapshot sections (see write_links_snapshot)."""
+        sections = {}
+        sections["host_offsets"], sections["host_arena"] = _string_section(self.hosts)
+        sections["host_ids"] = self.host_ids[:size].tobytes()
+        sections["url_offsets"], sections["url_arena"] = self.url_suffixes.section_bytes(size)
+        sections["raw_offsets"], sections["raw_arena"] = self.raw_paths.section_bytes(size)
+        sections["clean_offsets"], sections["clean_arena"] = self.clean_paths.section_bytes(size)
+        sections["depths"] = self.depths[:size].tobytes()
+        return sections
+
+# --- Search Index ---
+
+# Length of the n-grams stored in the substring index. Keywords shorter than this cannot be looked up
+# in the index and fall back to checking every candidate left by the other keywords.
+INDEX_GRAM_SIZE = 3
+
+def iter_grams(text: str):
+    """Yields every INDEX_GRAM_SIZE-character substring of text (with repeats)."""
+    for i in range(len(text) - INDEX_GRAM_SIZE + 1):
+        yield text[i:i + INDEX_GRAM_SIZE]
+
+# For every byte value, the positions (0-7) of its set bits. Used to walk bitsets a byte at a time.
+_BYTE_SET_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def build_bitset(flags: bytearray):
+    """Packs a bytearray of 0/1 flags (one per link ID) into an int bitset where bit N is link N."""
+    packed = bytearray((len(flags) + 7) // 8)
+    for link_id, flag in enumerate(flags):
+        if flag:
+            packed[link_id >> 3] |= 1 << (link_id & 7)
+    return int.from_bytes(packed, 'little')
+
+def iter_bitset(bitset: int, size: int):
+    """Yields the link IDs (ascending) whose bits are set in bitset, for a corpus of size links."""
+    for byte_index, value in enumerate(bitset.to_bytes((size + 7) // 8, 'little')):
+        if value:
+            base = byte_index << 3
+            for bit in _BYTE_SET_BITS[value]:
+                yield base + bit
+
+def intersect_postings(posting_lists: list):
+    """
+    Intersects sorted posting lists (ascending link IDs), rarest list first so the working
+    set only ever shrinks. Returns a sorted list of link IDs present in every list.
+    """
+    if not posting_lists:
+        return []
+    posting_lists = sorted(posting_lists, key=len)
+    result = list(posting_lists[0])
+    for postings in posting_lists[1:]:
+        if not result:
+            break
+        if len(result) * 16 < len(postings):
+            # Working set is tiny compared to this list: binary search instead of walking it
+            result = [link_id for link_id in result if _sorted_contains(postings, link_id)]
+        else:
+            keep = set(result)
+            result = [link_id for link_id in postings if link_id in keep]
+    return result
+
+def clip_postings(postings, id_range: tuple):
+    """The part of the ascending sequence postings with IDs in id_range = (first, end), end excluded."""
+    first, end = id_range
+    return postings[bisect.bisect_left(postings, first):bisect.bisect_left(postings, end)]
+
+def _sorted_contains(postings, link_id: int):
+    """True if link_id is present in the ascending sequence postings."""
+    position = bisect.bisect_left(postings, link_id)
+    return position < len(postings) and postings[position] == link_id
+
+class SearchBackend(abc.ABC):
+    """
+    Where the links are kept and searched (see SEARCH_BACKEND): a LinkIndex (in memory, or a MappedLinkIndex)
+    or a SqliteLinkIndex. search_links_by_keyword and score_kit_matches (through which every command, the
+    search cache and the worker pools search) answer through keyword_matches() and kit_matches() of whatever
+    backend they are given. Every backend also has:
+
+    - len(backend): the number of links it covers (link IDs 0..len-1, in load order)
+    - backend.records: url(link_id), urls(link_ids), iter_urls(), variant_urls(link_id), iter_variants(size), variant_count(size)
+
+    Reading records may block (a SqliteLinkIndex reads them from disk), so the event loop only does it through an executor.
+    """
+
+    @abc.abstractmethod
+    def keyword_matches(self, search_terms: list[str], time_budget: float = None, id_range: tuple = None):
+        """search_links_by_keyword on this backend: [matching URLs] in link ID order."""
+
+    @abc.abstractmethod
+    def kit_matches(self, primary_keywords: list[str], scope: str, search_mode: str, limit: int,
+                    policy: str = "top", seed: int = 0, time_budget: float = None, id_range: tuple = None):
+        """score_kit_matches on this backend: (total number of matches, [(selection key, link_id), ...] best first)."""
+
+    @abc.abstractmethod
+    def extended(self, new_records):
+        """A newer snapshot of this backend with new_records (LinkRecords / LinkVariants) appended."""
+
+class LinkIndex(SearchBackend):
+    """
+    Inverted index over LinkRecords. Link IDs are positions in `records`, a LinkStore holding the links'
+    fields in compact columns (records[link_id] rebuilds a LinkRecord, records.url(link_id) just the URL).
+
+    - token_postings: cleaned-path token -> ascending array of link IDs containing that token.
+    - gram_postings: n-gram of the raw or cleaned path -> ascending array of link IDs. Any keyword
+      that is a substring of a link's raw/cleaned path has all of its n-grams in that link's postings,
+      so intersecting them gives a small candidate set that keeps the old `k in path` semantics.
+
+    - scope_bitsets: scope name (from SCOPE_KEYWORDS) -> int bitset of links in that scope.
+    - content_bitset: int bitset of CONTENT links (the rest are CORE).
+
+    Candidates still have to be verified with the real substring check, the index only narrows them.
+
+    An index is a snapshot: it covers link IDs 0..size-1 and never changes once built. `extended()`
+    appends new links to the shared (append-only) link store and postings and returns a NEW snapshot
+    with a larger size, so searches still running on the old snapshot keep a consistent view.
+    """
+
+    def __init__(self, records):
+        self.records = LinkStore()
+        self.size = 0
+        self.token_postings = {}
+        self.gram_postings = {}
+        self.scope_bitsets = {scope: 0 for scope in SCOPE_KEYWORDS}
+        self.content_bitset = 0
+        self.all_bitset = 0
+        self._append(records)
+
+    def extended(self, new_records):
+        """
+        Returns a new snapshot covering this index's links plus new_records (any iterable of LinkRecords and LinkVariants).
+        Only the newest snapshot can be extended (older ones share the same storage).
+        """
+        if self.size != len(self.records):
+            raise RuntimeError("Only the newest LinkIndex snapshot can be extended.")
+        snapshot = copy.copy(self)
+        snapshot.scope_bitsets = dict(self.scope_bitsets)
+        snapshot._append(new_records)
+        return snapshot
+
+    def _append(self, new_records):
+        """
+        Adds new_records (IDs size, size+1, ...) to the shared storage and grows this snapshot over them.
+        new_records can be any iterable, e.g. a LinkReloader stream, so no intermediate list is built.
+        """
+        first_id = self.size
+        records = self.records
+        # Over a mapped snapshot's postings, new postings go to their in-memory overlay (see OverlayPostings)
+        token_postings = self.token_postings.delta if isinstance(self.token_postings, OverlayPostings) else self.token_postings
+        gram_postings = self.gram_postings.delta if isinstance(self.gram_postings, OverlayPostings) else self.gram_postings
+        scope_flags = {scope: bytearray() for scope in SCOPE_KEYWORDS}
+        content_flags = bytearray()
+        for record in new_records:
+            if type(record) is LinkVariant:
+                records.add_variant(record) # Attached to an already indexed link, not indexed itself
+                continue
+            link_id = len(records)
+            records.append(record) # Only the record's fields are kept, in the store's columns
+            for scope, fragments in SCOPE_KEYWORDS.items():
+                scope_flags[scope].append(any(x in record.raw_path for x in fragments))
+            content_flags.append(record.is_content)
+            # Compact typed arrays: 4 bytes per posting instead of a full Python int object each
+            for token in set(record.tokens):
+                postings = token_postings.get(token)
+                if postings is None:
+                    token_postings[token] = postings = array('I')
+                postings.append(link_id)
+            grams = set(iter_grams(record.raw_path))
+            grams.update(iter_grams(record.clean_path))
+            for gram in grams:
+                postings = gram_postings.get(gram)
+                if postings is None:
+                    gram_postings[gram] = postings = array('I')
+                postings.append(link_id)
+        for scope, flags in scope_flags.items():
+            self.scope_bitsets[scope] |= build_bitset(flags) << first_id
+        self.content_bitset |= build_bitset(content_flags) << first_id
+        self.size = len(records)
+        self.all_bitset = (1 << self.size) - 1
+
+    def _visible(self, link_ids: list):
+        """Drops IDs appended after this snapshot was taken (link_ids must be ascending)."""
+        if link_ids and link_ids[-1] >= self.size:
+            return link_ids[:bisect.bisect_left(link_ids, self.size)]
+        return link_ids
+
+    def __len__(self):
+        return self.size
+
+    def document_frequency(self, token: str):
+        """Number of links whose cleaned path contains token as a whole word."""
+        postings = self.token_postings.get(token, ())
+        return bisect.bisect_left(postings, self.size)
+
+    def filter_bitset(self, scope: str, search_mode: str):
+        """
+        Bitset of links that are in scope AND match the CORE/CONTENT search mode.
+        One AND over the whole corpus; unknown scopes match nothing.
+        """
+        scope_bitset = self.scope_bitsets.get(scope, 0)
+        if search_mode == "CONTENT":
+            return scope_bitset & self.content_bitset
+        return scope_bitset & ~self.content_bitset & self.all_bitset
+
+    def substring_postings(self, fragment: str, id_range: tuple = None):
+        """
+        Returns the sorted IDs of links whose raw or cleaned path MAY contain fragment,
+        or None if fragment is too short to be looked up (meaning: any link may match).
+        If id_range (first, end) is given, only IDs in that range are returned (see ShardedSearchEngine).
+        """
+        if len(fragment) < INDEX_GRAM_SIZE:
+            return None
+        posting_lists = []
+        for gram in set(iter_grams(fragment)):
+            postings = self.gram_postings.get(gram)
+            if postings is None:
+                return [] # A gram no link has: nothing can match
+            # A shard only intersects its own slice of every posting list
+            posting_lists.append(postings if id_range is None else clip_postings(postings, id_range))
+        return self._visible(intersect_postings(posting_lists))
+
+    def candidate_ids(self, fragment_groups: list, id_range: tuple = None):
+        """
+        Narrows the corpus for a query made of groups of alternative fragments:
+        a link must match at least one fragment of EVERY group (AND of ORs).
+        Plain keywords are single-fragment groups; platform terms like 'win' list all their fragments.
+        Returns a sorted list of candidate link IDs (within id_range, if given),
+        or None if no group could narrow the search.
+        """
+        posting_lists = []
+        for fragments in fragment_groups:
+            group_ids = set()
+            for fragment in fragments:
+                postings = self.substring_postings(fragment, id_range)
+                if postings is None:
+                    group_ids = None # This alternative can't be looked up, so the whole group can't narrow
+                    break
+                group_ids.update(postings)
+            if group_ids is None:
+                continue
+            if not group_ids:
+                return []
+            posting_lists.append(sorted(group_ids))
+        if not posting_lists:
+            return None
+        return self._visible(intersect_postings(posting_lists))
+
+    def iter_candidates(self, fragment_groups: list, bitset: int = None, id_range: tuple = None):
+        """
+        Yields the link ID of every candidate of candidate_ids(), or of every link if nothing narrowed.
+        If bitset is given (see filter_bitset), only links whose bit is set are yielded.
+        If id_range (first, end) is given, only link IDs first..end-1 are yielded (one shard of the corpus).
+        """
+        candidate_ids = self.candidate_ids(fragment_groups, id_range)
+        first, end = (0, self.size) if id_range is None else (id_range[0], min(id_range[1], self.size))
+        if bitset is None:
+            link_ids = range(first, end) if candidate_ids is None else candidate_ids
+        elif candidate_ids is None:
+            # Only the shard's bits are unpacked
+            shard_bits = bitset >> first & ((1 << max(0, end - first)) - 1)
+            link_ids = (first + link_id for link_id in iter_bitset(shard_bits, max(0, end - first)))
+        else:
+            packed = bitset.to_bytes((self.size + 7) // 8, 'little')
+            link_ids = (link_id for link_id in candidate_ids if packed[link_id >> 3] >> (link_id & 7) & 1)
+        return iter(link_ids)
+
+    def layer_ranges(self, id_range: tuple = None):
+        """
+        Yields (first link ID, LinkStore, (first, end)) for every store holding some of this snapshot's links
+        in id_range (all of them if None): the store's links are IDs first.. (its own IDs start at 0).
+        """
+        first_id, end_id = (0, self.size) if id_range is None else (id_range[0], min(id_range[1], self.size))
+        for first, layer in self.records.layers():
+            layer_range = (max(first_id, first), min(end_id, first + len(layer)))
+            if layer_range[0] < layer_range[1]:
+                yield first, layer, layer_range
+
+    def keyword_matches(self, search_terms: list[str], time_budget: float = None, id_range: tuple = None):
+        """search_links_by_keyword on the postings: candidates from the n-gram index, checked on the path arenas."""
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        terms_lower = [term.lower() for term in search_terms]
+        # Platform terms match any of their raw-path fragments, other terms match as a substring of the cleaned path
+        fragment_groups = [PLATFORM_TERM_FRAGMENTS.get(term, [term]) for term in terms_lower]
+        # Terms are matched against the UTF-8 bytes in the link store's arenas, without building any strings
+        term_checks = [
+            ([x.encode('utf-8') for x in PLATFORM_TERM_FRAGMENTS[term]] if term in PLATFORM_TERM_FRAGMENTS else None, term.encode('utf-8'))
+            for term in terms_lower
+        ]
+        matching_links = []
+
+        # Links kept in different stores (a mapped snapshot and its overlay) are checked one store at a time
+        for first, layer, layer_range in self.layer_ranges(id_range):
+            raw_buffer, raw_offsets, raw_base = layer.raw_paths.buffer, layer.raw_paths.offsets, layer.raw_paths.base
+            clean_buffer, clean_offsets, clean_base = layer.clean_paths.buffer, layer.clean_paths.offsets, layer.clean_paths.base
+
+            # Only links that the index says can contain every term are checked
+            for checked, link_id in enumerate(self.iter_candidates(fragment_groups, id_range=layer_range)):
+                if deadline is not None and not checked & 1023 and time.monotonic() > deadline:
+                    raise SearchTimeout(f"Keyword search for {search_terms} ran out of time")
+                local_id = link_id - first
+                raw_start, raw_end = raw_base + raw_offsets[local_id], raw_base + raw_offsets[local_id + 1]
+                clean_start, clean_end = clean_base + clean_offsets[local_id], clean_base + clean_offsets[local_id + 1]
+                
+                all_terms_match = True
+                for platform_fragments, term_bytes in term_checks:
+                    # --- Specific Matching Logic for Platform/Installer Keywords ---
+                    if platform_fragments is not None:
+                        term_found_in_link = any(raw_buffer.find(x, raw_start, raw_end) >= 0 for x in platform_fragments)
+                    # --- General Keyword Matching ---
+                    else:
+                        term_found_in_link = clean_buffer.find(term_bytes, clean_start, clean_end) >= 0 # Use cleaned path for non-specific terms
+                    
+                    if not term_found_in_link:
+                        all_terms_match = False
+                        break # If any term is not found, this link doesn't match all criteria
+                
+                if all_terms_match:
+                    matching_links.append(layer.url(local_id))
+        
+        return matching_links
+
+    def kit_matches(self, primary_keywords: list[str], scope: str, search_mode: str, limit: int,
+                    policy: str = "top", seed: int = 0, time_budget: float = None, id_range: tuple = None):
+        """score_kit_matches on the postings and bitsets: candidates from the index, scored on the link store's columns."""
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        weighted = policy == "weighted"
+        core_bonus = 2 if search_mode == "CORE" else 0
+        total_matches = 0
+        # Keywords are matched against the UTF-8 bytes in the link store's arenas, without building any strings
+        keyword_bytes = [k.encode('utf-8') for k in primary_keywords]
+
+        def scored_matches(first: int, layer: LinkStore, layer_range: tuple):
+            nonlocal total_matches
+            raw_buffer, raw_offsets, raw_base = layer.raw_paths.buffer, layer.raw_paths.offsets, layer.raw_paths.base
+            clean_buffer, clean_offsets, clean_base = layer.clean_paths.buffer, layer.clean_paths.offsets, layer.clean_paths.base
+            depths = layer.depths
+            # --- Step 4: Filter links by scope and search mode ---
+            # 4a + 4b: Scope check and identity vs content check, as one AND over the precomputed bitsets
+            # (skips content items for CORE searches and core items for CONTENT searches)
+            allowed_links = self.filter_bitset(scope, search_mode)
+            # Only allowed links whose paths can contain every keyword (per the index) are checked
+            for checked, link_id in enumerate(self.iter_candidates([[k] for k in primary_keywords], allowed_links, layer_range)):
+                if deadline is not None and not checked & 1023 and time.monotonic() > deadline:
+                    raise SearchTimeout(f"Kit search for {primary_keywords} in scope '{scope}' ran out of time")
+                # 4c: Primary keyword match (exact/loose), scored in the same pass
+                # --- Step 5: Rank by confidence (exact name, short path, core over content) ---
+                local_id = link_id - first
+                raw_start, raw_end = raw_base + raw_offsets[local_id], raw_base + raw_offsets[local_id + 1]
+                clean_start, clean_end = clean_base + clean_offsets[local_id], clean_base + clean_offsets[local_id + 1]
+                score = 0
+                for k in keyword_bytes:
+                    if raw_buffer.find(k, raw_start, raw_end) >= 0:
+                        score += 5 # exact primary keyword match
+                    elif clean_buffer.find(k, clean_start, clean_end) >= 0:
+                        score += 3
+                    else:
+                        break
+                else:
+                    total_matches += 1
+                    # shorter paths = higher score
+                    score += max(0, 10 - depths[local_id])
+                    # prefer core over content for CORE searches (every link left in a CORE search is core)
+                    score += core_bonus
+                    if weighted:
+                        yield (score / SEARCH_SAMPLING_TEMPERATURE + selection_noise(seed, link_id), -link_id)
+                    else:
+                        yield (score, -link_id)
+
+        # Links kept in different stores (a mapped snapshot and its overlay) are scored one store at a time
+        top = heapq.nlargest(limit, itertools.chain.from_iterable(
+            scored_matches(first, layer, layer_range) for first, layer, layer_range in self.layer_ranges(id_range)
+        ))
+        return total_matches, [(key, -negative_id) for key, negative_id in top]
+
+# --- Compiled Index Snapshots ---
+# Binary layout of a snapshot file (native byte order, checked on load):
+#   8-byte magic | u64 metadata length | metadata JSON | padding to 8 bytes | sections...
+# The metadata holds the link count, the source file states (for incremental reloads) and the
+# offset/length of every section relative to the end of the padding. Sections:
+#   host_offsets / host_arena        : the distinct 'scheme://host' prefixes (see LinkStore)
+#   host_ids                         : u32 host per link
+#   {url,raw,clean}_offsets / _arena : u64 string end offsets + concatenated UTF-8 strings (url = URL after the host)
+#   depths                           : u16 path depth per link
+#   variant_ids / variant_offsets / variant_arena : u32 link ID + URL of every grouped near-duplicate (see LinkVariant)
+#   {token,gram}_key_offsets / _key_arena / _posting_offsets / _postings : sorted keys + u32 link ID postings
+#   scope_<name> / content           : packed bitsets (bit N = link N, little-endian)
+#   seen_digests                     : the LinkReloader's LinkDigestSet table (u64 digests), if saved with it
+#   group_digests / group_ids        : its near-duplicate groups (u64 link_digest -> u32 link ID), when grouping
+
+SNAPSHOT_MAGIC = b"VLTIDX01"
+# Bump when the layout, get_clean_url_path, canonical_link_key or LinkRecord fields change, so old snapshots are rebuilt.
+SNAPSHOT_FORMAT_VERSION = 5
+
+def snapshot_vocabulary_fingerprint():
+    """Identifies the keyword tables (and grouping setting) a snapshot's bitsets, postings and links were built with."""
+    return json.dumps([SNAPSHOT_FORMAT_VERSION, INDEX_GRAM_SIZE, SCOPE_KEYWORDS, IDENTITY_KEYWORDS, LINKS_GROUP_NEAR_DUPLICATES], sort_keys=True)
+
+class MappedPostings:
+    """
+    Read-only {key: postings} mapping inside a mapped snapshot. Keys are sorted by their UTF-8 bytes
+    and found by binary search; postings are returned as zero-copy u32 memoryviews.
+    """
+
+    def __init__(self, keys: StringArena, posting_offsets: memoryview, postings: memoryview):
+        self.keys = keys
+        self.posting_offsets = posting_offsets
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _key_bytes(self, i: int):
+        keys = self.keys
+        return keys.buffer[keys.base + keys.offsets[i]:keys.base + keys.offsets[i + 1]]
+
+    def get(self, key: str, default=None):
+        target = key.encode('utf-8')
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.keys) and self._key_bytes(lo) == target:
+            return self.postings[self.posting_offsets[lo]:self.posting_offsets[lo + 1]]
+        return default
+
+    def __iter__(self):
+        for i in range(len(self.keys)):
+            yield self.keys[i]
+
+    def items(self):
+        for i in range(len(self.keys)):
+            yield self.keys[i], self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]]
+
+class MappedLinkIndex(LinkIndex):
+    """
+    A LinkIndex read straight from a memory-mapped snapshot file: postings and strings are used in place
+    (zero copies), so opening one takes milliseconds whatever the vault size, and several bot processes
+    on one host share the same pages. Only the scope/content bitsets are copied into ints.
+    Snapshots are read-only; extending one gives an in-memory LinkIndex that keeps using the mapped
+    postings and columns, with the new links in overlays (see OverlayPostings and OverlayLinkStore).
+    `dedup` holds the reloader's duplicate tracking saved with the snapshot (see LinkReloader._resume_dedup), or None.
+    """
+
+    def __init__(self, path: str, view: memoryview, meta: dict, data_start: int):
+        def section(name, fmt='B'):
+            offset, length = meta["sections"][name]
+            part = view[data_start + offset:data_start + offset + length]
+            return part.cast(fmt) if fmt != 'B' else part
+
+        def strings(name):
+            # Strings are read and searched straight from the mapped file (view.obj), not through a memoryview copy
+            return StringArena(section(f"{name}_offsets", 'Q'), view.obj, data_start + meta["sections"][f"{name}_arena"][0])
+
+        def postings(name):
+            return MappedPostings(strings(f"{name}_key"), section(f"{name}_posting_offsets", 'Q'), section(f"{name}_postings", 'I'))
+
+        self.path = path
+        self.snapshot_id = meta["snapshot_id"]
+        self.size = meta["link_count"]
+        content = bytes(section("content"))
+        variants = {}
+        for link_id, url in zip(section("variant_ids", 'I'), strings("variant")):
+            variants.setdefault(link_id, []).append(url) # Only a few links have variants: decoded up front
+        self.records = LinkStore(
+            list(strings("host")), section("host_ids", 'I'), strings("url"), strings("raw"), strings("clean"),
+            section("depths", 'H'), content, variants
+        )
+        self.token_postings = postings("token")
+        self.gram_postings = postings("gram")
+        self.scope_bitsets = {scope: int.from_bytes(section(f"scope_{scope}"), 'little') for scope in SCOPE_KEYWORDS}
+        self.content_bitset = int.from_bytes(content, 'little')
+        self.all_bitset = (1 << self.size) - 1
+        self.dedup = None
+        if "dedup" in meta:
+            groups = None
+            if "group_digests" in meta["sections"]:
+                groups = (section("group_digests", 'Q'), section("group_ids", 'I'))
+            self.dedup = (section("seen_digests", 'Q'), meta["dedup"]["seen_links"], groups)
+
+    def extended(self, new_records):
+        """
+        Returns an in-memory LinkIndex with this snapshot's links plus new_records. The snapshot itself is
+        read-only: the new links go to overlays on top of it, so this only costs as much as the new links.
+        """
+        snapshot = LinkIndex(())
+        snapshot.records = OverlayLinkStore(self)
+        snapshot.token_postings = OverlayPostings(self, "token")
+        snapshot.gram_postings = OverlayPostings(self, "gram")
+        snapshot.size = self.size
+        snapshot.scope_bitsets = dict(self.scope_bitsets)
+        snapshot.content_bitset = self.content_bitset
+        snapshot.all_bitset = self.all_bitset
+        snapshot._append(new_records)
+        return snapshot
+
+    def __reduce__(self):
+        # Process pool workers re-map the same file instead of receiving a pickled copy of the index
+        return (_reopen_mapped_index, (self.path, self.snapshot_id))
+
+class OverlayPostings:
+    """
+    The {key: postings} of a LinkIndex extended from a MappedLinkIndex: the snapshot's mapped postings
+    (`name` = "token" or "gram") plus `delta`, an in-memory dict of the postings of links added since
+    (LinkIndex._append writes there). Keys with no new postings are returned straight from the snapshot.
+    """
+
+    def __init__(self, mapped_index: MappedLinkIndex, name: str, delta: dict = None):
+        self.mapped_index = mapped_index
+        self.name = name
+        self.base = getattr(mapped_index, f"{name}_postings")
+        self.delta = {} if delta is None else delta
+
+    def get(self, key: str, default=None):
+        base = self.base.get(key)
+        extra = self.delta.get(key)
+        if extra is None:
+            return default if base is None else base
+        if base is None:
+            return extra
+        postings = array('I')
+        postings.frombytes(base.cast('B')) # Snapshot IDs all come before the new ones, so this stays sorted
+        postings.extend(extra)
+        return postings
+
+    def __iter__(self):
+        yield from self.base
+        for key in self.delta:
+            if self.base.get(key) is None:
+                yield key
+
+    def __reduce__(self):
+        # The snapshot is mapped again (see MappedLinkIndex.__reduce__), only the overlay is pickled
+        return (OverlayPostings, (self.mapped_index, self.name, self.delta))
+
+class OverlayLinkStore:
+    """
+    The `records` of a LinkIndex extended from a MappedLinkIndex: the snapshot's mapped LinkStore (`base`,
+    link IDs below its size) plus an in-memory LinkStore (`delta`) for the links added since. The delta's own
+    IDs start at 0; it shares the base's host table, so host IDs mean the same in both.
+    """
+
+    def __init__(self, mapped_index: MappedLinkIndex, delta: LinkStore = None):
+        self.mapped_index = mapped_index
+        self.base = mapped_index.records
+        self.first_delta_id = len(self.base)
+        self.delta = LinkStore(list(self.base.hosts)) if delta is None else delta
+
+    def append(self, record: LinkRecord):
+        self.delta.append(record)
+
+    def add_variant(self, variant: LinkVariant):
+        self.delta.add_variant(variant) # Variants are keyed by (global) link ID in either store
+
+    def variant_urls(self, link_id: int):
+        return [*self.base.variant_urls(link_id), *self.delta.variant_urls(link_id)]
+
+    def iter_variants(self, size: int = None):
+        yield from self.base.iter_variants(size)
+        yield from self.delta.iter_variants(size)
+
+    def variant_count(self, size: int = None):
+        return self.base.variant_count(size) + self.delta.variant_count(size)
+
+    def __len__(self):
+        return self.first_delta_id + len(self.delta)
+
+    def url(self, link_id: int):
+        if link_id < self.first_delta_id:
+            return self.base.url(link_id)
+        return self.delta.url(link_id - self.first_delta_id)
+
+    def urls(self, link_ids):
+        return [self.url(link_id) for link_id in link_ids]
+
+    def __getitem__(self, link_id: int):
+        if link_id < self.first_delta_id:
+            return self.base[link_id]
+        return self.delta[link_id - self.first_delta_id]
+
+    def __iter__(self):
+        yield from self.base
+        yield from self.delta
+
+    def iter_urls(self):
+        yield from self.base.iter_urls()
+        yield from self.delta.iter_urls()
+
+    def layers(self):
+        return [(0, self.base), (self.first_delta_id, self.delta)]
+
+    def snapshot_sections(self, size: int):
+        """Like LinkStore.snapshot_sections: the base's columns with the delta's appended."""
+        base, delta = self.base, self.delta
+        base_size, delta_size = self.first_delta_id, size - self.first_delta_id
+        sections = {}
+        sections["host_offsets"], sections["host_arena"] = _string_section(delta.hosts) # The base's hosts come first
+        sections["host_ids"] = base.host_ids[:base_size].tobytes() + delta.host_ids[:delta_size].tobytes()
+        for name, base_strings, delta_strings in (
+            ("url", base.url_suffixes, delta.url_suffixes), ("raw", base.raw_paths, delta.raw_paths), ("clean", base.clean_paths, delta.clean_paths)
+        ):
+            base_offsets, base_arena = base_strings.section_bytes(base_size)
+            delta_offsets, delta_arena = delta_strings.section_bytes(delta_size)
+            shift = base_strings.offsets[base_size] # The delta's strings go after the base's in the arena
+            shifted = array('Q', (offset + shift for offset in array('Q', delta_offsets)[1:]))
+            sections[f"{name}_offsets"], sections[f"{name}_arena"] = base_offsets + shifted.tobytes(), base_arena + delta_arena
+        sections["depths"] = base.depths[:base_size].tobytes() + delta.depths[:delta_size].tobytes()
+        return sections
+
+    def __reduce__(self):
+        return (OverlayLinkStore, (self.mapped_index, self.delta))
+
+def encode_file_states(file_states: dict):
+    """{filename: LinkFileState} as JSON-friendly lists, for saving with a compiled index."""
+    return {
+        filename: [state.inode, state.size, state.mtime_ns, state.offset, state.tail.hex()]
+        for filename, state in file_states.items()
+    }
+
+def decode_file_states(encoded: dict):
+    return {
+        filename: LinkFileState(inode, size, mtime_ns, offset, bytes.fromhex(tail))
+        for filename, (inode, size, mtime_ns, offset, tail) in encoded.items()
+    }
+
+def _string_section(values):
+    """Packs strings into (u64 end offsets, UTF-8 arena) section bytes."""
+    offsets = array('Q', [0])
+    arena = bytearray()
+    for value in values:
+        arena += value.encode('utf-8')
+        offsets.append(len(arena))
+    return offsets.tobytes(), bytes(arena)
+
+def write_links_snapshot(index: LinkIndex, file_states: dict, path: str, dedup: tuple = None):
+    """
+    Compiles index (the links it can see, i.e. IDs below its size) into a snapshot file at path.
+    file_states ({filename: LinkFileState}) is stored so a later startup can resume incremental reloads,
+    and so is dedup, the LinkReloader's (seen_links, near_duplicate_groups) for those links, if given.
+    The file is written next to path and renamed over it, so readers never see a half-written snapshot.
+    """
+    size = index.size
+    store = index.records
+    # The link store's columns are written as they are (only the part this snapshot can see)
+    sections = store.snapshot_sections(size)
+    variants = list(store.iter_variants(size))
+    sections["variant_ids"] = array('I', (variant.link_id for variant in variants)).tobytes()
+    sections["variant_offsets"], sections["variant_arena"] = _string_section(variant.url for variant in variants)
+    for name, postings_by_key in (("token", index.token_postings), ("gram", index.gram_postings)):
+        keys = []
+        posting_offsets = array('Q', [0])
+        postings = array('I')
+        for key in sorted(postings_by_key, key=lambda k: k.encode('utf-8')):
+            key_postings = postings_by_key.get(key)
+            visible = key_postings[:bisect.bisect_left(key_postings, size)]
+            if len(visible):
+                keys.append(key)
+                if isinstance(visible, memoryview):
+                    postings.frombytes(visible.cast('B')) # Mapped postings are copied as raw bytes
+                else:
+                    postings.extend(visible)
+                posting_offsets.append(len(postings))
+        sections[f"{name}_key_offsets"], sections[f"{name}_key_arena"] = _string_section(keys)
+        sections[f"{name}_posting_offsets"] = posting_offsets.tobytes()
+        sections[f"{name}_postings"] = postings.tobytes()
+    bitset_bytes = (size + 7) // 8
+    for scope in SCOPE_KEYWORDS:
+        sections[f"scope_{scope}"] = (index.scope_bitsets[scope] & index.all_bitset).to_bytes(bitset_bytes, 'little')
+    sections["content"] = (index.content_bitset & index.all_bitset).to_bytes(bitset_bytes, 'little')
+    if dedup is not None:
+        seen_links, near_duplicate_groups = dedup
+        sections["seen_digests"] = seen_links.table.tobytes()
+        if near_duplicate_groups is not None:
+            sections["group_digests"] = array('Q', near_duplicate_groups.keys()).tobytes()
+            sections["group_ids"] = array('I', near_duplicate_groups.values()).tobytes()
+
+    layout = {}
+    position = 0
+    for name, data in sections.items():
+        layout[name] = [position, len(data)]
+        position += (len(data) + 7) // 8 * 8 # Keep every section 8-byte aligned
+    meta = {
+        "snapshot_id": uuid.uuid4().hex,
+        "byteorder": sys.byteorder,
+        "vocabulary": snapshot_vocabulary_fingerprint(),
+        "link_count": size,
+        "files": encode_file_states(file_states),
+        "sections": layout
+    }
+    if dedup is not None:
+        meta["dedup"] = {"seen_links": len(dedup[0])}
+    meta = json.dumps(meta).encode('utf-8')
+    header = SNAPSHOT_MAGIC + len(meta).to_bytes(8, 'little') + meta
+    header += b"\0" * (-len(header) % 8)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(header)
+        for data in sections.values():
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    os.replace(temp_path, path)
+
+def open_links_snapshot(path: str, expected_snapshot_id: str = None):
+    """
+    Memory-maps the snapshot at path. Returns (MappedLinkIndex, {filename: LinkFileState}).
+    Raises ValueError if the file is not a snapshot this version of the bot can use
+    (or not the expected one, when expected_snapshot_id is given).
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if bytes(view[:8]) != SNAPSHOT_MAGIC:
+        raise ValueError(f"'{path}' is not a links snapshot")
+    meta_length = int.from_bytes(view[8:16], 'little')
+    meta = json.loads(str(view[16:16 + meta_length], 'utf-8'))
+    if meta["byteorder"] != sys.byteorder or meta["vocabulary"] != snapshot_vocabulary_fingerprint():
+        raise ValueError(f"'{path}' was built by a different version of the bot or on another platform")
+    if expected_snapshot_id is not None and meta["snapshot_id"] != expected_snapshot_id:
+        raise ValueError(f"'{path}' was replaced by a newer snapshot")
+    data_start = 16 + meta_length
+    data_start += -data_start % 8
+    return MappedLinkIndex(path, view, meta, data_start), decode_file_states(meta["files"])
+
+def _reopen_mapped_index(path: str, snapshot_id: str):
+    """Unpickling helper for MappedLinkIndex: maps the same snapshot file again."""
+    return open_links_snapshot(path, snapshot_id)[0]
+
+# --- SQLite Search Backend ---
+# Schema of SQLITE_DATABASE_FILE (link IDs are the same as in a LinkIndex built from the same files):
+#   links(id, url, raw_path, clean_path, depth, is_content) : one row per link, the LinkRecord fields
+#   link_text                 : FTS5 trigram index over links.raw_path / clean_path (stores no copy of the text);
+#                               a quoted keyword of 3+ characters finds exactly the paths containing it
+#   link_scopes(scope, is_content, link_id) : the scope/CORE-CONTENT filters as one indexed (clustered) table
+#   variants(link_id, url)    : grouped near-duplicates (see LinkVariant)
+#   token_counts(token, links): cleaned-path words and how many links have them, for autocomplete
+#   meta(name, value)         : schema/vocabulary fingerprint, link count, source file states (JSON)
+
+# Bump when the schema changes, so old databases are rebuilt.
+SQLITE_SCHEMA_VERSION = 1
+# How many links are inserted per batch while loading
+SQLITE_INSERT_BATCH = 10000
+
+SQLITE_SCHEMA = """
+CREATE TABLE meta(name TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE links(id INTEGER PRIMARY KEY, url TEXT NOT NULL, raw_path TEXT NOT NULL, clean_path TEXT NOT NULL,
+                   depth INTEGER NOT NULL, is_content INTEGER NOT NULL);
+CREATE VIRTUAL TABLE link_text USING fts5(raw_path, clean_path, content='links', content_rowid='id',
+                                          tokenize='trigram case_sensitive 1');
+CREATE TABLE link_scopes(scope TEXT NOT NULL, is_content INTEGER NOT NULL, link_id INTEGER NOT NULL,
+                         PRIMARY KEY (scope, is_content, link_id)) WITHOUT ROWID;
+CREATE TABLE variants(link_id INTEGER NOT NULL, url TEXT NOT NULL);
+CREATE INDEX variants_by_link ON variants(link_id);
+CREATE TABLE token_counts(token TEXT PRIMARY KEY, links INTEGER NOT NULL) WITHOUT ROWID;
+"""
+
+def sqlite_fingerprint():
+    """Identifies the schema and keyword tables a database was built with."""
+    return json.dumps([SQLITE_SCHEMA_VERSION, snapshot_vocabulary_fingerprint()])
+
+def fts_phrase(text: str):
+    """text as an FTS5 phrase (quoted, so it is matched literally)."""
+    return '"' + text.replace('"', '""') + '"'
+
+class SqliteConnectionPool:
+    """
+    Up to `size` connections to the database at path, shared by the threads that search it
+    (each borrows one for a query; the rest wait). Connections are opened on first use and kept.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA query_only = ON") # Only the reloader writes, on its own connection
+        connection.execute("PRAGMA mmap_size = 268435456") # Read pages straight from the OS cache
+        return connection
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self.slots:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                yield connection
+            finally:
+                self.idle.put(connection)
+
+class SqliteLinkRecords:
+    """The `records` of a SqliteLinkIndex: the read access a LinkStore gives, answered from the database."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return self.index.size
+
+    def url(self, link_id: int):
+        with self.index.pool.connection() as connection:
+            row = connection.execute("SELECT url FROM links WHERE id = ?", (link_id,)).fetchone()
+        if row is None:
+            raise IndexError(link_id)
+        return row[0]
+
+    def urls(self, link_ids):
+        """The URLs of link_ids, in the same order, read with one query."""
+        link_ids = list(link_ids)
+        with self.index.pool.connection() as connection:
+            found = dict(connection.execute(
+                f"SELECT id, url FROM links WHERE id IN ({','.join('?' * len(link_ids))})", link_ids
+            ))
+        return [found[link_id] for link_id in link_ids]
+
+    def __getitem__(self, link_id: int):
+        with self.index.pool.connection() as connection:
+            row = connection.execute(
+                "SELECT url, raw_path, clean_path, depth, is_content FROM links WHERE id = ?", (link_id,)
+            ).fetchone()
+        if row is None:
+            raise IndexError(link_id)
+        url, raw_path, clean_path, depth, is_content = row
+        return LinkRecord.from_fields(url, raw_path, clean_path, depth, bool(is_content))
+
+    def __iter__(self):
+        for link_id in range(len(self)):
+            yield self[link_id]
+
+    def iter_urls(self):
+        with self.index.pool.connection() as connection:
+            for (url,) in connection.execute("SELECT url FROM links WHERE id < ? ORDER BY id", (self.index.size,)):
+                yield url
+
+    def variant_urls(self, link_id: int):
+        with self.index.pool.connection() as connection:
+            return [url for (url,) in connection.execute("SELECT url FROM variants WHERE link_id = ? ORDER BY rowid", (link_id,))]
+
+    def iter_variants(self, size: int = None):
+        with self.index.pool.connection() as connection:
+            rows = connection.execute(
+                "SELECT link_id, url FROM variants WHERE link_id < ? ORDER BY rowid", (self.index.size if size is None else size,)
+            ).fetchall()
+        for link_id, url in rows:
+            yield LinkVariant(link_id, url)
+
+    def variant_count(self, size: int = None):
+        with self.index.pool.connection() as connection:
+            return connection.execute(
+                "SELECT count(*) FROM variants WHERE link_id < ?", (self.index.size if size is None else size,)
+            ).fetchone()[0]
+
+class SqliteLinkIndex(SearchBackend):
+    """
+    Search backend keeping the links in a SQLite database (SEARCH_BACKEND = "sqlite"), so the vault can be
+    much bigger than RAM and a restart just reopens the file. Searches narrow the candidates with the FTS5
+    trigram index and the indexed scope table, then check and score them with exactly the rules of the
+    in-memory search (same keys, same tie-breaks), so both backends give the same results.
+
+    Like a LinkIndex, an instance is a snapshot covering link IDs 0..size-1: extended() appends new links to
+    the database in one transaction and returns a new snapshot, and searches only see IDs below their size.
+    The database runs in WAL mode, so searches keep reading while a reload writes. All snapshots of one
+    database share a SqliteConnectionPool; loads write on a connection of their own.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self.pool = SqliteConnectionPool(path, SQLITE_POOL_SIZE)
+        self.records = SqliteLinkRecords(self)
+
+    def __len__(self):
+        return self.size
+
+    def __reduce__(self):
+        # Process pool workers open the same database file instead of receiving a pickled copy
+        return (SqliteLinkIndex, (self.path, self.size))
+
+    @staticmethod
+    def _connect_writer(path: str):
+        connection = sqlite3.connect(path, isolation_level=None) # Transactions are started explicitly
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA cache_size = -65536") # 64 MB of page cache for bulk loads
+        return connection
+
+    @classmethod
+    def build(cls, path: str, new_records):
+        """
+        (Re)creates the database at path with new_records (any iterable of LinkRecords and LinkVariants, e.g.
+        a LinkReloader stream) in one transaction. Searches on the previous contents keep running until it commits.
+        """
+        connection = cls._connect_writer(path)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Start from an empty schema (DROP also removes the full-text index's own tables)
+                tables = connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('meta', 'links', 'link_text', 'link_scopes', 'variants', 'token_counts')"
+                ).fetchall()
+                for (name,) in tables:
+                    connection.execute(f"DROP TABLE {name}")
+                for statement in SQLITE_SCHEMA.split(";"): # (executescript would commit the open transaction)
+                    if statement.strip():
+                        connection.execute(statement)
+                size = cls._insert(connection, new_records, 0)
+                connection.executemany("INSERT INTO meta VALUES (?, ?)", [("fingerprint", sqlite_fingerprint()), ("link_count", str(size))])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)") # Don't keep a WAL as big as the whole load around
+        finally:
+            connection.close()
+        return cls(path, size)
+
+    @classmethod
+    def open(cls, path: str):
+        """
+        Opens the database at path. Returns (SqliteLinkIndex, {filename: LinkFileState}).
+        Raises ValueError if it is not a complete database this version of the bot can use.
+        """
+        connection = sqlite3.connect(path)
+        try:
+            meta = dict(connection.execute("SELECT name, value FROM meta"))
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"'{path}' is not a links database: {e}")
+        finally:
+            connection.close()
+        if meta.get("fingerprint") != sqlite_fingerprint():
+            raise ValueError(f"'{path}' was built by a different version of the bot")
+        if "files" not in meta:
+            raise ValueError(f"'{path}' was not finished (the load building it was interrupted)")
+        return cls(path, int(meta["link_count"])), decode_file_states(json.loads(meta["files"]))
+
+    @staticmethod
+    def _insert(connection, new_records, first_id: int):
+        """Inserts new_records (IDs first_id, first_id+1, ...) in batches. Returns the new link count."""
+        link_rows, scope_rows, variant_rows = [], [], []
+        tokens = Counter()
+
+        def flush():
+            connection.executemany("INSERT INTO links VALUES (?, ?, ?, ?, ?, ?)", link_rows)
+            connection.executemany(
+                "INSERT INTO link_text(rowid, raw_path, clean_path) VALUES (?, ?, ?)",
+                ((link_id, raw_path, clean_path) for link_id, _, raw_path, clean_path, _, _ in link_rows)
+            )
+            connection.executemany("INSERT INTO link_scopes VALUES (?, ?, ?)", scope_rows)
+            connection.executemany("INSERT INTO variants VALUES (?, ?)", variant_rows)
+            connection.executemany(
+                "INSERT INTO token_counts VALUES (?, ?) ON CONFLICT(token) DO UPDATE SET links = links + excluded.links",
+                tokens.items()
+            )
+            link_rows.clear()
+            scope_rows.clear()
+            variant_rows.clear()
+            tokens.clear()
+
+        link_id = first_id
+        for record in new_records:
+            if type(record) is LinkVariant:
+                variant_rows.append((record.link_id, record.url))
+                continue
+            is_content = int(record.is_content)
+            link_rows.append((link_id, record.url, record.raw_path, record.clean_path, min(record.depth, 0xFFFF), is_content))
+            for scope, fragments in SCOPE_KEYWORDS.items():
+                if any(x in record.raw_path for x in fragments):
+                    scope_rows.append((scope, is_content, link_id))
+            tokens.update(set(record.tokens))
+            link_id += 1
+            if len(link_rows) >= SQLITE_INSERT_BATCH:
+                flush()
+        flush()
+        return link_id
+
+    def extended(self, new_records):
+        """Appends new_records to the database and returns a new snapshot covering them (only the newest can be extended)."""
+        connection = self._connect_writer(self.path)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                stored_size = int(connection.execute("SELECT value FROM meta WHERE name = 'link_count'").fetchone()[0])
+                if stored_size != self.size:
+                    raise RuntimeError("Only the newest SqliteLinkIndex snapshot can be extended.")
+                size = self._insert(connection, new_records, self.size)
+                connection.execute("UPDATE meta SET value = ? WHERE name = 'link_count'", (str(size),))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+        snapshot = copy.copy(self)
+        snapshot.size = size
+        snapshot.records = SqliteLinkRecords(snapshot)
+        return snapshot
+
+    def save_file_states(self, file_states: dict):
+        """Stores how far each links file was read (the database counts as complete from then on)."""
+        connection = self._connect_writer(self.path)
+        try:
+            connection.execute(
+                "INSERT INTO meta VALUES ('files', ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (json.dumps(encode_file_states(file_states)),)
+            )
+        finally:
+            connection.close()
+
+    @contextlib.contextmanager
+    def _reading(self, time_budget: float, what: str):
+        """Borrows a pooled connection; queries on it are interrupted (SearchTimeout) once time_budget seconds pass."""
+        with self.pool.connection() as connection:
+            if time_budget is not None:
+                deadline = time.monotonic() + time_budget
+                connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            try:
+                yield connection
+            except sqlite3.OperationalError as e:
+                if time_budget is not None and "interrupted" in str(e):
+                    raise SearchTimeout(f"{what} ran out of time")
+                raise
+            finally:
+                connection.set_progress_handler(None, 0)
+
+    def _id_bounds(self, id_range: tuple):
+        """The link IDs (first, end) a search covers: id_range, if given, within this snapshot."""
+        return (0, self.size) if id_range is None else (id_range[0], min(id_range[1], self.size))
+
+    def keyword_matches(self, search_terms: list[str], time_budget: float = None, id_range: tuple = None):
+        terms_lower = [term.lower() for term in search_terms]
+        # Same checks as LinkIndex.keyword_matches; the full-text query only narrows the rows to check
+        # (terms or fragments under 3 characters can't be looked up in a trigram index and are only checked)
+        term_checks = [(PLATFORM_TERM_FRAGMENTS.get(term), term) for term in terms_lower]
+        clauses = []
+        for fragments, term in term_checks:
+            if fragments is not None:
+                if all(len(x) >= 3 for x in fragments):
+                    clauses.append("(" + " OR ".join(f"raw_path : {fts_phrase(x)}" for x in fragments) + ")")
+            elif len(term) >= 3:
+                clauses.append(f"clean_path : {fts_phrase(term)}")
+        if clauses:
+            query = ("SELECT l.url, l.raw_path, l.clean_path FROM link_text JOIN links l ON l.id = link_text.rowid "
+                     "WHERE link_text MATCH ? AND link_text.rowid >= ? AND link_text.rowid < ? ORDER BY link_text.rowid")
+            parameters = (" AND ".join(clauses), *self._id_bounds(id_range))
+        else:
+            query = "SELECT url, raw_path, clean_path FROM links WHERE id >= ? AND id < ? ORDER BY id"
+            parameters = self._id_bounds(id_range)
+
+        matching_links = []
+        with self._reading(time_budget, f"Keyword search for {search_terms}") as connection:
+            for url, raw_path, clean_path in connection.execute(query, parameters):
+                for fragments, term in term_checks:
+                    if fragments is not None:
+                        if not any(x in raw_path for x in fragments):
+                            break
+                    elif term not in clean_path:
+                        break
+                else:
+                    matching_links.append(url)
+        return matching_links
+
+    def kit_matches(self, primary_keywords: list[str], scope: str, search_mode: str, limit: int,
+                    policy: str = "top", seed: int = 0, time_budget: float = None, id_range: tuple = None):
+        weighted = policy == "weighted"
+        core_bonus = 2 if search_mode == "CORE" else 0
+        is_content = int(search_mode == "CONTENT")
+        clauses = [fts_phrase(k) for k in primary_keywords if len(k) >= 3]
+        if clauses:
+            query = ("SELECT l.id, l.raw_path, l.clean_path, l.depth FROM link_text JOIN links l ON l.id = link_text.rowid "
+                     "WHERE link_text MATCH ? AND link_text.rowid >= ? AND link_text.rowid < ? AND EXISTS ("
+                     "SELECT 1 FROM link_scopes s WHERE s.scope = ? AND s.is_content = ? AND s.link_id = l.id)")
+            parameters = (" AND ".join(clauses), *self._id_bounds(id_range), scope, is_content)
+        else:
+            query = ("SELECT l.id, l.raw_path, l.clean_path, l.depth FROM link_scopes s JOIN links l ON l.id = s.link_id "
+                     "WHERE s.scope = ? AND s.is_content = ? AND s.link_id >= ? AND s.link_id < ?")
+            parameters = (scope, is_content, *self._id_bounds(id_range))
+        total_matches = 0
+
+        def scored_matches(rows):
+            nonlocal total_matches
+            # Scored exactly like LinkIndex.kit_matches
+            for link_id, raw_path, clean_path, depth in rows:
+                score = 0
+                for k in primary_keywords:
+                    if k in raw_path:
+                        score += 5
+                    elif k in clean_path:
+                        score += 3
+                    else:
+                        break
+                else:
+                    total_matches += 1
+                    score += max(0, 10 - depth) + core_bonus
+                    if weighted:
+                        yield (score / SEARCH_SAMPLING_TEMPERATURE + selection_noise(seed, link_id), -link_id)
+                    else:
+                        yield (score, -link_id)
+
+        with self._reading(time_budget, f"Kit search for {primary_keywords} in scope '{scope}'") as connection:
+            top = heapq.nlargest(limit, scored_matches(connection.execute(query, parameters)))
+        return total_matches, [(key, -negative_id) for key, negative_id in top]
+
+    def frequent_tokens(self, prefix: str, limit: int):
+        """Up to limit vocabulary words starting with prefix, most links first (for KeywordSuggester)."""
+        with self.pool.connection() as connection:
+            return [token for (token,) in connection.execute(
+                "SELECT token FROM token_counts WHERE token >= ? AND token < ? ORDER BY links DESC, token LIMIT ?",
+                (prefix, prefix + "\U0010ffff", limit)
+            )]
+
 # --- Helper Functions ---
 
-def load_all_links_from_files(filenames: list):
-    """Loads all links from a list of specified text files into a single list."""
-    links = set() # Use a set to automatically handle duplicates across all files
-    total_files_processed = 0
-    total_links_found_in_files = 0
-    
-    for filename in filenames:
+def parse_link_lines(text: str):
+    """Yields the links in text, skipping comments, empty lines, and category headers from harvester output."""
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and not line.startswith('---'):
+            yield line
+
+# Query parameters that only track where a click came from and never change the page (plus anything starting with 'utm_')
+TRACKING_QUERY_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid", "_ga"}
+
+def canonical_link_key(url: str):
+    """
+    Deduplication key for a link: the same page gets the same key however it was written. The scheme, 'www.',
+    default ports, trailing slashes, the #fragment and tracking parameters are dropped, the host is lowercased
+    and the remaining query parameters are sorted. E.g. 'http://WWW.Site.com/kit/?utm_source=x' -> 'site.com/kit'.
+    Path ';params' are part of the path (urlsplit), so '/a;x' and '/a;y' stay different links.
+    """
+    parsed = urlsplit(url)
+    host = parsed.hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parsed.port
+    except ValueError: # Malformed port: keep the URL as written
+        port = None
+    if port is not None and port not in (80, 443):
+        host = f"{host}:{port}"
+    key = host + (parsed.path.rstrip('/') or "/")
+    query = sorted(
+        f"{name}={value}" for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_QUERY_PARAMS and not name.lower().startswith("utm_")
+    )
+    return f"{key}?{'&'.join(query)}" if query else key
+
+# A trailing '/2024-03-01' or '/2024-03-01-1234' date/ID segment, or a purely numeric one ('/5123'), after a
+# slug segment (one with '-' or '_', like 'download_serum_v1_2'), so '/news/2024-03-01' pages are not grouped
+_REPOST_DATE_SEGMENT = re.compile(r'(/[^/]*[-_][^/]*)/(\d{4}-\d{2}-\d{2}(-\d+)?|\d+)$')
+# Slug suffix marking a re-posted copy: '-copy', '-repost' or '-reupload' (optionally numbered, '...-copy-2') or a
+# date ('...-2024-03-01', '...-20240301'), after a word with letters. Plain numbers are never folded, since they are
+# as often volumes or parts ('...-vol-2', '...-serum-2') as reposts, and versions ('...-v1-2', '...-1-0-2') are kept.
+_REPOST_SLUG_SUFFIX = re.compile(r'([/-][a-z0-9]*[a-z][a-z0-9]*)-(?:(?:copy|repost|reupload)(?:-\d+)?|\d{4}-\d{2}-\d{2}|20\d{6})$')
+
+def near_duplicate_key(link_key: str):
+    """
+    Grouping key for reposts of the same release (see LINKS_GROUP_NEAR_DUPLICATES), from a canonical_link_key:
+    the lowercased path without a trailing date/ID segment or copy/date repost suffix. Platform words and
+    versions are kept as they are, so 'serum-win' / 'serum-mac' or 'v1-2' / 'v1-3' stay separate.
+    """
+    path, _, query = link_key.lower().partition('?')
+    path = _REPOST_DATE_SEGMENT.sub(r'\1', path)
+    path = _REPOST_SLUG_SUFFIX.sub(r'\1', path)
+    return f"{path}?{query}" if query else path
+
+def _open_zstd(f, mode: str):
+    if zstandard is None:
+        raise RuntimeError("reading .zst link lists needs the zstandard package (pip3 install zstandard)")
+    return zstandard.open(f, mode)
+
+# File extension -> function wrapping an open binary file of that kind in a decompressing reader
+COMPRESSED_LINKS_OPENERS = {".gz": gzip.open, ".xz": lzma.open, ".zst": _open_zstd}
+
+def is_compressed_links_file(filename: str):
+    return os.path.splitext(filename)[1].lower() in COMPRESSED_LINKS_OPENERS
+
+def decompressed_links_file(f, filename: str):
+    """Returns a binary reader over the links in the open file f, decompressing it on the fly for .gz/.xz/.zst lists."""
+    opener = COMPRESSED_LINKS_OPENERS.get(os.path.splitext(filename)[1].lower())
+    return opener(f, 'rb') if opener is not None else f
+
+def link_digest(text: str):
+    """64-bit digest of text (BLAKE2b): unlike hash(), the same in every process, so it can be saved in a snapshot. Never 0."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+class LinkDigestSet:
+    """
+    Compact set of links for deduplication: each link is stored as a 64-bit digest (link_digest) in an
+    open-addressing table (array('Q'), linear probing, kept at most half full), about 16 bytes per link
+    instead of a set entry plus a second reference to every URL string. The table is saved in compiled
+    snapshots as it is, so a restart doesn't have to rebuild it (see LinkReloader._resume_dedup).
+    Two different links share a digest with a probability of about n² / 2^65 (under 1 in 30 million for a
+    million-link vault), in which case the second one would be skipped as a duplicate.
+    """
+
+    def __init__(self, links=(), table=None, count: int = 0):
+        self.table = array('Q', bytes(8 * 1024)) if table is None else array('Q', table)
+        self.mask = len(self.table) - 1
+        self.count = count
+        for link in links:
+            self.add(link)
+
+    @staticmethod
+    def _digest(link: str):
+        return link_digest(link) # 0 marks an empty slot, link_digest never returns it
+
+    def _insert(self, digest: int):
+        table, mask = self.table, self.mask
+        slot = digest & mask
+        while True:
+            value = table[slot]
+            if value == digest:
+                return False
+            if not value:
+                table[slot] = digest
+                self.count += 1
+                return True
+            slot = (slot + 1) & mask
+
+    def add(self, link: str):
+        """Adds link. Returns True if it was new, False if it was already in the set."""
+        if self.count * 2 >= len(self.table):
+            old_table = self.table
+            self.table = array('Q', bytes(16 * len(old_table)))
+            self.mask = len(self.table) - 1
+            self.count = 0
+            for digest in old_table:
+                if digest:
+                    self._insert(digest)
+        return self._insert(self._digest(link))
+
+    def __contains__(self, link: str):
+        table, mask = self.table, self.mask
+        digest = self._digest(link)
+        slot = digest & mask
+        while table[slot]:
+            if table[slot] == digest:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+    def __len__(self):
+        return self.count
+
+class LinkFileState:
+    """
+    How far the reloader has read one links file. `offset` is the byte position right after the last
+    complete line; `tail` holds the bytes just before it, so a rewritten file can be told apart from
+    one that only had lines appended. Compressed files are always read whole: their offset is
+    the file size and their tail is empty.
+    """
+    __slots__ = ("inode", "size", "mtime_ns", "offset", "tail")
+
+    # How many bytes before the offset are remembered to detect rewrites
+    TAIL_BYTES = 64
+
+    def __init__(self, inode: int, size: int, mtime_ns: int, offset: int, tail: bytes):
+        self.inode = inode
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.offset = offset
+        self.tail = tail
+
+class LinkReloader:
+    """
+    Loads LINKS_FILES and keeps track of what was read from each file (see LinkFileState) plus the set
+    of links already seen, so a reload only ingests the lines appended since the previous one.
+    If a file was truncated, rewritten or removed, the next reload falls back to a full load
+    (so does any change to a compressed file, which can't be appended to).
+
+    Files are streamed line by line: load_full() and load_appended() return generators of LinkRecords
+    that LinkIndex consumes directly, so the raw file contents are never held in memory all at once.
+    Links are deduplicated by canonical_link_key; with LINKS_GROUP_NEAR_DUPLICATES, reposts of a link
+    already loaded are yielded as LinkVariants of it instead of new LinkRecords.
+    """
+
+    def __init__(self, filenames: list, snapshot_path: str = "", database_path: str = ""):
+        self.filenames = filenames
+        self.snapshot_path = snapshot_path # Compiled snapshot to start from and keep up to date ("" = none)
+        self.database_path = database_path # SQLite database to keep the links in instead of memory ("" = in-memory LinkIndex)
+        self.file_states = {} # filename -> LinkFileState
+        self.seen_links = LinkDigestSet() # Canonical key of every link loaded so far, across all files (None until needed after opening a snapshot)
+        self.near_duplicate_groups = None # link_digest(near_duplicate_key) -> link ID of the group's indexed link (when grouping)
+        self.next_link_id = 0 # Link ID the next new LinkRecord will get in the index
+        self.grouped_variants = 0 # Near-duplicates attached as variants by the current load
+
+    def _file_status(self, filename: str, state):
+        """
+        Compares filename with what was read from it (state). Returns "new" (never read), "unchanged",
+        "appended" or "rewritten" (truncated, replaced or edited in place).
+        Raises FileNotFoundError if the file is gone.
+        """
+        stat = os.stat(filename)
+        if state is None:
+            return "new"
+        if stat.st_ino != state.inode or stat.st_size < state.offset:
+            return "rewritten"
+        if stat.st_size == state.size and stat.st_mtime_ns == state.mtime_ns:
+            return "unchanged" # Untouched since the last reload
+        if is_compressed_links_file(filename):
+            return "rewritten"
+        with open(filename, 'rb') as f:
+            f.seek(state.offset - len(state.tail))
+            if f.read(len(state.tail)) != state.tail:
+                return "rewritten"
+        return "appended"
+
+    def _stream_from(self, filename: str, start: int, complete_lines_only: bool = False):
+        """
+        Yields the links in filename from byte offset start (0 = the whole file), one line at a time.
+        With complete_lines_only, a last line without a newline is left for the next read (it may still be
+        being written). Once the file is exhausted, its new LinkFileState is stored in file_states.
+        """
+        compressed = is_compressed_links_file(filename)
+        with open(filename, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            f.seek(start)
+            offset = start
+            for raw_line in decompressed_links_file(f, filename):
+                # The offset only moves past complete lines, so an unterminated last line is read again next time
+                # (the seen-links set keeps it from being added twice if it was already complete).
+                if raw_line.endswith(b'\n'):
+                    offset += len(raw_line)
+                elif complete_lines_only and not compressed:
+                    break # Possibly half-written: index it once its newline is there
+                yield from parse_link_lines(raw_line.decode('utf-8'))
+            if compressed:
+                offset, tail = stat.st_size, b""
+            else:
+                tail_start = max(0, offset - LinkFileState.TAIL_BYTES)
+                f.seek(tail_start)
+                tail = f.read(offset - tail_start)
+        self.file_states[filename] = LinkFileState(stat.st_ino, stat.st_size, stat.st_mtime_ns, offset, tail)
+
+    def _reset_dedup(self):
+        self.seen_links = LinkDigestSet() # Compact digest set to handle duplicates across all files
+        self.near_duplicate_groups = {} if LINKS_GROUP_NEAR_DUPLICATES else None
+        self.next_link_id = 0
+
+    def _resume_dedup(self, index: SearchBackend):
+        """
+        Resumes the duplicate tracking for the links (and variants) already in index, e.g. one opened from a snapshot:
+        from the tracking saved with a compiled snapshot, or else by going over every link again.
+        """
+        self._reset_dedup()
+        saved = index.dedup if isinstance(index, MappedLinkIndex) else None
+        if saved is not None and (saved[2] is not None or self.near_duplicate_groups is None):
+            seen_table, seen_count, groups = saved
+            self.seen_links = LinkDigestSet(table=seen_table, count=seen_count)
+            if self.near_duplicate_groups is not None:
+                self.near_duplicate_groups = dict(zip(*groups))
+            return
+        store = index.records
+        for link_id, url in enumerate(itertools.islice(store.iter_urls(), len(index))):
+            link_key = canonical_link_key(url)
+            self.seen_links.add(link_key)
+            if self.near_duplicate_groups is not None:
+                self.near_duplicate_groups.setdefault(link_digest(near_duplicate_key(link_key)), link_id)
+        for variant in store.iter_variants(len(index)):
+            self.seen_links.add(canonical_link_key(variant.url))
+
+    def _new_records(self, filename: str, start: int, complete_lines_only: bool = False):
+        """
+        Yields a LinkRecord for every link in filename (from byte offset start) not seen before,
+        or a LinkVariant if it is a near-duplicate of one (when grouping).
+        """
+        links = self._stream_from(filename, start, complete_lines_only)
+        groups = self.near_duplicate_groups
+        read = added = 0
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                links_in_current_file = 0
-                for line in f:
-                    line = line.strip()
-                    # Skip comments, empty lines, and category headers from harvester output
-                    if line and not line.startswith('#') and not line.startswith('---'):
-                        links.add(line)
-                        links_in_current_file += 1
-            print(f"Successfully loaded {links_in_current_file} links from '{filename}'.")
+            for link in links:
+                read += 1
+                link_key = canonical_link_key(link)
+                if not self.seen_links.add(link_key):
+                    continue # Same page as a link already loaded
+                if groups is not None:
+                    group = link_digest(near_duplicate_key(link_key))
+                    representative = groups.get(group)
+                    if representative is not None:
+                        self.grouped_variants += 1
+                        yield LinkVariant(representative, link)
+                        continue
+                    groups[group] = self.next_link_id
+                self.next_link_id += 1
+                added += 1
+                yield LinkRecord(link) # Precompute search features once per link
+        except Exception as e:
+            print(f"ERROR: Failed to load links from '{filename}' after {read} links: {e}. Skipping the rest of this file.")
+            return
+        if not start:
+            print(f"Successfully loaded {read} links from '{filename}'.")
+        elif added:
+            print(f"Loaded {added} new links appended to '{filename}'.")
+
+    def load_full(self):
+        """
+        Loads all links from every file from scratch: yields LinkRecords (first occurrence order).
+        Each record carries the parsed/cleaned path so searches never re-parse URLs.
+        """
+        self.file_states = {}
+        self._reset_dedup()
+        self.grouped_variants = 0
+        total_files_processed = 0
+
+        for filename in self.filenames:
+            try:
+                self._file_status(filename, None)
+            except FileNotFoundError:
+                print(f"WARNING: The file '{filename}' was not found. Skipping this file.")
+                continue
+            yield from self._new_records(filename, 0)
             total_files_processed += 1
-            total_links_found_in_files += links_in_current_file
-        except FileNotFoundError:
-            print(f"WARNING: The file '{filename}' was not found. Skipping this file.")
+
+        grouped = f" ({self.grouped_variants} near-duplicates grouped with them)" if self.grouped_variants else ""
+        print(f"Finished loading from {total_files_processed} files. Total unique links loaded: {self.next_link_id}{grouped}.")
+
+    def new_index(self, new_records):
+        """Builds a search backend over new_records from scratch: a LinkIndex, or the SQLite database if configured."""
+        if self.database_path:
+            return SqliteLinkIndex.build(self.database_path, new_records)
+        return LinkIndex(new_records)
+
+    def load_snapshot(self):
+        """
+        Opens the compiled snapshot (or the SQLite database), if there is a usable one, and resumes file tracking
+        from it. Returns a MappedLinkIndex (or SqliteLinkIndex), or None (none configured, missing, or built by
+        another bot version or from different LINKS_FILES). Files changed since it was compiled are handled by the next refresh.
+        """
+        path = self.database_path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            index, file_states = SqliteLinkIndex.open(path) if self.database_path else open_links_snapshot(path)
+        except Exception as e:
+            print(f"WARNING: Ignoring links snapshot '{path}': {e}")
+            return None
+        if not set(file_states) <= set(self.filenames):
+            print(f"WARNING: Links snapshot '{path}' was built from other LINKS_FILES. Rebuilding it.")
+            return None
+        self.file_states = file_states
+        self.seen_links = None # Built from the snapshot only if new lines show up
+        print(f"Opened links snapshot '{path}' with {len(index)} links.")
+        return index
+
+    def save_snapshot(self, index: SearchBackend):
+        """
+        Compiles index (the newest one this reloader loaded) to the snapshot file (if one is configured), together
+        with the current file states and duplicate tracking. A SQLite database already holds the links: only the
+        file states are stored in it. Returns True if it was saved.
+        """
+        path = self.database_path or self.snapshot_path
+        if not path:
+            return False
+        try:
+            if isinstance(index, SqliteLinkIndex):
+                index.save_file_states(self.file_states)
+            else:
+                dedup = None if self.seen_links is None else (self.seen_links, self.near_duplicate_groups)
+                write_links_snapshot(index, self.file_states, path, dedup)
+            print(f"Saved links snapshot '{path}' ({len(index)} links).")
+            return True
         except Exception as e:
-            print(f"ERROR: Failed to load links from '{filename}': {e}. Skipping this file.")
-            
-    print(f"Finished loading from {total_files_processed} files. Total unique links loaded: {len(links)}.")
-    return list(links) # Convert back to list for random selection
+            print(f"WARNING: Failed to save links snapshot '{path}': {e}")
+            return False
+
+    def changed_files(self):
+        """
+        Checks every file against what was read from it. Returns the list of (filename, start offset) to read
+        appended lines from, or None if a full load is needed instead.
+        """
+        changed = []
+        for filename in self.filenames:
+            state = self.file_states.get(filename)
+            try:
+                status = self._file_status(filename, state)
+            except FileNotFoundError:
+                if state is not None:
+                    print(f"WARNING: The file '{filename}' was removed. Doing a full reload.")
+                    return None
+                continue
+            except Exception as e:
+                print(f"ERROR: Failed to check links file '{filename}': {e}. Skipping this file.")
+                continue
+            if status == "rewritten":
+                print(f"The file '{filename}' was rewritten or truncated. Doing a full reload.")
+                return None
+            if status != "unchanged":
+                changed.append((filename, 0 if state is None else state.offset))
+        return changed
+
+    def load_appended(self, index: LinkIndex, changed: list):
+        """
+        Loads only the links appended to the changed files (from changed_files()) since the last load
+        (index holds everything loaded so far). Yields the new LinkRecords (and LinkVariants).
+        """
+        if self.seen_links is None:
+            self._resume_dedup(index)
+        self.next_link_id = len(index)
+        self.grouped_variants = 0
+        for filename, start in changed:
+            # Files may be written to right now: a line without its newline yet waits for the next reload
+            yield from self._new_records(filename, start, complete_lines_only=True)
+
+    def refresh(self, index, force_full: bool = False):
+        """
+        Brings index up to date with the files. Returns (new index, number of links added, full reload?).
+        The returned index is index itself if nothing changed. With no index yet, starts from the
+        compiled snapshot when it is still valid (not a full reload: only lines appended since it was saved are read).
+        """
+        first_load = index is None
+        if first_load and not force_full:
+            index = self.load_snapshot()
+        if index is not None and not force_full:
+            changed = self.changed_files()
+            if changed is not None:
+                previous_size = len(index)
+                new_records = self.load_appended(index, changed)
+                first_record = next(new_records, None)
+                if first_record is not None: # Only build a new snapshot if there really is something new
+                    index = index.extended(itertools.chain((first_record,), new_records))
+                return index, len(index) if first_load else len(index) - previous_size, False
+        index = self.new_index(self.load_full())
+        return index, len(index), True
+
+def compile_links_snapshot():
+    """
+    Offline compile step (`python3 420VaultBot.py --compile`): loads LINKS_FILES and writes LINKS_SNAPSHOT_FILE
+    (or builds SQLITE_DATABASE_FILE, with SEARCH_BACKEND = "sqlite").
+    """
+    if SEARCH_BACKEND == "sqlite":
+        reloader = LinkReloader(LINKS_FILES, database_path=SQLITE_DATABASE_FILE)
+    elif not LINKS_SNAPSHOT_FILE:
+        print("ERROR: LINKS_SNAPSHOT_FILE is not set. Set it in the CONFIGURATION SECTION to compile a snapshot.")
+        return
+    else:
+        reloader = LinkReloader(LINKS_FILES, LINKS_SNAPSHOT_FILE)
+    reloader.save_snapshot(reloader.new_index(reloader.load_full()))
 
-async def resolve_target_channels():
+link_reloader = LinkReloader(LINKS_FILES, LINKS_SNAPSHOT_FILE, SQLITE_DATABASE_FILE if SEARCH_BACKEND == "sqlite" else "")
+
+class ChannelRegistry:
     """
-    Resolves TARGET_CHANNEL_NAMES to actual Discord Channel objects across all guilds the bot is in.
-    Stores resolved objects in `resolved_target_channels` dictionary.
+    Index of the text channels named in TARGET_CHANNEL_NAMES, by normalized (lowercase) name,
+    per guild and across all guilds, with each channel's "bot can send messages here" status cached.
+    It is built in one pass over every guild's channels (rebuild()) and then kept current from the
+    channel, guild, role and member events below, so `#sendlink` lookups are a dict lookup in
+    `resolved` (the resolved_target_channels dictionary) and never rescan guilds.
+
+    Each name resolves to a channel the bot can send to, from the first guild (in the order they
+    were registered) that has one; inside a guild, the channel listed first (by position) wins.
     """
-    global resolved_target_channels
-    resolved_target_channels.clear() # Clear any previous resolutions
 
-    print("\nAttempting to resolve configured target channel names to objects...")
-    
-    # Iterate through all guilds the bot is a member of
-    for guild in bot.guilds:
+    def __init__(self, target_names: list, resolved: dict):
+        self.target_names = dict.fromkeys(self.normalize(name) for name in target_names) # Ordered set
+        self.resolved = resolved # name -> discord.TextChannel
+        self.guild_channels = {} # guild ID -> {name: [channels with that name]}, guilds in registration order
+        self.can_send = {} # channel ID -> cached permission status
+
+    @staticmethod
+    def normalize(name: str):
+        return name.strip().lower()
+
+    def _resolve(self, name: str):
+        """Recomputes which channel `name` resolves to. Returns it (or None)."""
+        for channels_by_name in self.guild_channels.values():
+            for channel in channels_by_name.get(name, ()):
+                if self.can_send.get(channel.id):
+                    self.resolved[name] = channel
+                    return channel
+        self.resolved.pop(name, None)
+        return None
+
+    def _track(self, channel):
+        """Adds channel (if it has a target name) without resolving. Returns its name, or None if not tracked."""
+        name = self.normalize(channel.name)
+        if name not in self.target_names:
+            return None
+        channels = self.guild_channels.setdefault(channel.guild.id, {}).setdefault(name, [])
+        channels.append(channel)
+        channels.sort(key=lambda c: (c.position, c.id))
+        self.can_send[channel.id] = channel.permissions_for(channel.guild.me).send_messages
+        if not self.can_send[channel.id]:
+            print(f"    WARNING: Bot lacks 'Send Messages' permission in '{channel.name}' ({channel.id}) in guild '{channel.guild.name}'. Skipping.")
+        return name
+
+    def _untrack(self, channel):
+        """Removes channel (by ID). Returns the name it was tracked under, or None."""
+        channels_by_name = self.guild_channels.get(channel.guild.id, {})
+        for name, channels in channels_by_name.items():
+            for i, tracked in enumerate(channels):
+                if tracked.id == channel.id:
+                    del channels[i]
+                    if not channels:
+                        del channels_by_name[name]
+                    self.can_send.pop(channel.id, None)
+                    return name
+        return None
+
+    def rebuild(self, guilds):
+        """Forgets everything and indexes every text channel of guilds in one pass."""
+        self.resolved.clear()
+        self.guild_channels = {}
+        self.can_send = {}
+        for guild in guilds:
+            self.add_guild(guild, resolve=False)
+        for name in self.target_names:
+            channel = self._resolve(name)
+            if channel is not None:
+                print(f"    Resolved '{name}' in '{channel.guild.name}' to {channel.mention} (ID: {channel.id})")
+
+    def add_guild(self, guild, resolve: bool = True):
         print(f"  Searching in guild: '{guild.name}' ({guild.id})")
-        for target_name in TARGET_CHANNEL_NAMES:
-            # Find text channels in the current guild that match the target name (case-insensitive)
-            # discord.utils.get is efficient for this.
-            # Handle special characters/emojis by direct comparison as names are often exact
-            channel = discord.utils.get(guild.text_channels, name=target_name) # Exact match for emoji names
-            if not channel: # Fallback to lowercase comparison if exact match fails
-                 channel = discord.utils.get(guild.text_channels, name=target_name.lower())
-
-            if channel:
-                if channel.permissions_for(guild.me).send_messages:
-                    # Store resolved channel object using its lowercase name as key for consistent lookup
-                    if target_name.lower() not in resolved_target_channels: # Avoid duplicates if channel name exists in multiple guilds
-                        resolved_target_channels[target_name.lower()] = channel
-                        print(f"    Resolved '{target_name}' in '{guild.name}' to {channel.mention} (ID: {channel.id})")
-                else:
-                    print(f"    WARNING: Bot lacks 'Send Messages' permission in '{channel.name}' ({channel.id}) in guild '{guild.name}'. Skipping.")
-            # else:
-            #     print(f"    Channel '{target_name}' not found in guild '{guild.name}'.") # Uncomment for more verbose debug
+        self.guild_channels.setdefault(guild.id, {})
+        names = {self._track(channel) for channel in guild.text_channels}
+        if resolve:
+            for name in names - {None}:
+                self._resolve(name)
+
+    def remove_guild(self, guild):
+        channels_by_name = self.guild_channels.pop(guild.id, {})
+        for name, channels in channels_by_name.items():
+            for channel in channels:
+                self.can_send.pop(channel.id, None)
+            self._resolve(name)
+
+    def add_channel(self, channel):
+        name = self._track(channel)
+        if name is not None:
+            self._resolve(name)
+
+    def remove_channel(self, channel):
+        name = self._untrack(channel)
+        if name is not None:
+            self._resolve(name)
+
+    def update_channel(self, before, after):
+        """A channel was renamed, moved or had its permission overwrites changed."""
+        for name in {self._untrack(before), self._track(after)} - {None}:
+            self._resolve(name)
+
+    def refresh_permissions(self, guild):
+        """Re-checks the cached permission status of every tracked channel in guild (after role/member changes)."""
+        for name, channels in self.guild_channels.get(guild.id, {}).items():
+            for channel in channels:
+                self.can_send[channel.id] = channel.permissions_for(guild.me).send_messages
+            self._resolve(name)
+
+channel_registry = ChannelRegistry(TARGET_CHANNEL_NAMES, resolved_target_channels)
+
+@perf_timed("channels.resolve")
+async def resolve_target_channels():
+    """
+    Resolves TARGET_CHANNEL_NAMES to actual Discord Channel objects across all guilds the bot is in,
+    by rebuilding channel_registry in one pass over every guild's channels.
+    Stores resolved objects in `resolved_target_channels` dictionary. Afterwards the channel events keep it current.
+    """
+    print("\nAttempting to resolve configured target channel names to objects...")
+    channel_registry.rebuild(bot.guilds)
 
     if not resolved_target_channels:
         print("WARNING: No target channels were successfully resolved or bot lacks permissions in them. Check `TARGET_CHANNEL_NAMES` and bot's guild permissions.")
@@ -151,66 +2294,205 @@ def get_clean_url_path(url):
     path = re.sub(r'\s+', ' ', path).strip()
     return path.lower()
 
-def search_links_by_keyword(search_terms: list[str]):
+def parse_search_query(search_query: str):
+    """
+    Splits a raw `#searchkit` query into lowercase keywords and explicit parameters.
+    Tokens like `scope:plugin` or `os:win` become parameters ({'scope': 'plugin'}),
+    everything else is treated as a keyword.
+    Returns a tuple of (keywords list, parameters dict).
+    """
+    keywords = []
+    params = {}
+    for token in search_query.lower().split():
+        name, sep, value = token.partition(':')
+        if sep and value and name in SEARCH_PARAM_NAMES:
+            params[name] = value
+        else:
+            keywords.append(token)
+    return keywords, params
+
+def infer_search_scope(keywords: list[str]):
+    """
+    Guesses a search scope from the query keywords using SCOPE_KEYWORDS
+    (e.g., 'serum preset' -> 'preset'). Returns None if no scope fits.
+    """
+    joined_keywords = " ".join(keywords)
+    for scope, words in SCOPE_KEYWORDS.items():
+        if any(word in joined_keywords for word in words):
+            return scope
+    return None
+
+def search_links_by_keyword(index: SearchBackend, search_terms: list[str], time_budget: float = None, id_range: tuple = None):
     """
-    Searches all loaded links where ALL provided search_terms are found in their cleaned URL paths.
+    Searches all links in index where ALL provided search_terms are found in their cleaned URL paths.
     Includes special, more explicit matching logic for platform/type keywords.
-    Returns a list of matching links.
+    Pure function of its arguments, so it can run in a search worker (see run_search).
+    Raises SearchTimeout if time_budget seconds pass before it finishes.
+    If id_range (first, end) is given, only links with IDs in that range are searched (one shard).
+    Returns a list of matching links, in link ID order.
     """
-    if not all_loaded_links or not search_terms:
+    if index is None or not len(index) or not search_terms:
         return []
+    return index.keyword_matches(search_terms, time_budget, id_range)
 
-    matching_links = []
-    
-    for link in all_loaded_links:
-        # Get the full, raw path for broad matching
-        raw_path_lower = urlparse(link).path.strip('/').lower()
-        # Also get a cleaned path for more general keyword searches
-        cleaned_path_lower = get_clean_url_path(link)
-        
-        all_terms_match = True
-        for term in search_terms:
-            term_lower = term.lower()
-            term_found_in_link = False
-
-            # --- Specific Matching Logic for Platform/Installer Keywords ---
-            if term_lower == "win":
-                if "windows" in raw_path_lower or ".exe" in raw_path_lower or "installer-win" in raw_path_lower or "win-installer" in raw_path_lower or "for-windows" in raw_path_lower:
-                    term_found_in_link = True
-            elif term_lower == "mac":
-                if "mac" in raw_path_lower or "macos" in raw_path_lower or ".dmg" in raw_path_lower or ".pkg" in raw_path_lower or "installer-mac" in raw_path_lower or "for-mac" in raw_path_lower:
-                    term_found_in_link = True
-            elif term_lower == "installer":
-                if "installer" in raw_path_lower or ".exe" in raw_path_lower or ".dmg" in raw_path_lower or ".pkg" in raw_path_lower or "setup" in raw_path_lower:
-                    term_found_in_link = True
-            # --- General Keyword Matching ---
-            elif term_lower in cleaned_path_lower: # Use cleaned path for non-specific terms
-                term_found_in_link = True
-            
-            if not term_found_in_link:
-                all_terms_match = False
-                break # If any term is not found, this link doesn't match all criteria
-        
-        if all_terms_match:
-            matching_links.append(link)
-    
-    return matching_links
+def determine_search_mode(keywords: list[str], scope: str):
+    """
+    Decides whether a `#searchkit` query looks for CORE links (the main plugin) or CONTENT links
+    (expansions/presets/etc), from its keywords and scope.
+    """
+    if any(k in keywords for k in IDENTITY_KEYWORDS) or scope in CONTENT_SCOPES:
+        return "CONTENT"
+    return "CORE"
+
+def selection_noise(seed: int, link_id: int):
+    """
+    Standard Gumbel noise for link_id, derived deterministically from (seed, link_id) with a
+    splitmix64-style hash. The same seed always perturbs a link the same way, wherever it is scored.
+    """
+    x = (seed * 0x9E3779B97F4A7C15 + link_id + 1) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    x ^= x >> 31
+    uniform = ((x >> 11) + 0.5) / 9007199254740992.0 # (0, 1), never exactly 0 or 1
+    return -math.log(-math.log(uniform))
+
+def score_kit_matches(index: SearchBackend, primary_keywords: list[str], scope: str, search_mode: str,
+                      limit: int, policy: str = "top", seed: int = 0, time_budget: float = None, id_range: tuple = None):
+    """
+    Steps 4-5 of `#searchkit`: filters the links in index by scope, CORE/CONTENT mode and keywords,
+    scores every match in the same pass and keeps only the best `limit` with a heap (O(n log limit)).
+    policy "top" keeps the highest scores; "weighted" samples without replacement with probability
+    growing with the score (Gumbel top-k: score / SEARCH_SAMPLING_TEMPERATURE plus Gumbel noise from seed).
+    Ties go to the lower link ID, so results only depend on the arguments.
+    Raises SearchTimeout if time_budget seconds pass before it finishes.
+    If id_range (first, end) is given, only links with IDs in that range are scored (one shard): since every
+    key only depends on its own link, merging the shards' top `limit` gives exactly the unsharded result.
+    Returns (total number of matches, [(selection key, link_id), ...] best first).
+    """
+    return index.kit_matches(primary_keywords, scope, search_mode, limit, policy, seed, time_budget, id_range)
+
+def rank_kit_matches(index: LinkIndex, primary_keywords: list[str], scope: str, search_mode: str,
+                     limit: int, policy: str = "top", seed: int = 0, time_budget: float = None):
+    """
+    Runs score_kit_matches and keeps only the selected link IDs: compact enough to cache and to page through
+    (see ResultCursor), index.records.url(link_id) gives their URLs.
+    Pure function of its arguments, so it can run in a search worker.
+    Returns (total number of matches, array('I') of selected link IDs, best first).
+    """
+    total_matches, top = score_kit_matches(index, primary_keywords, scope, search_mode, limit, policy, seed, time_budget)
+    return total_matches, array('I', (link_id for _, link_id in top))
+
+def rotation_key(seed: int, link: str):
+    """Position of link in the random order of the rotation cycle started with seed (ties broken by the URL itself)."""
+    return hash((seed, link)), link
+
+class SendRotation:
+    """
+    Where one `#sendlink` (query, channel) pair is in its rotation through the matching links. A cycle sends
+    the links in ascending rotation_key(seed, link) order, i.e. a random order fixed by `seed`, and
+    last_key is the key of the last link sent: everything at or below it was already sent this cycle.
+    That is all that is kept, whatever the number of matches (no list of sent links). Keys come from the URL,
+    not from the link ID or its position in the results, so the rotation carries over reloads: links already
+    sent stay sent, and new links join the current cycle (or the next one, if they sort before last_key).
+    """
+    __slots__ = ("seed", "last_key", "sent")
+
+    def __init__(self):
+        self.new_cycle()
+
+    def new_cycle(self):
+        self.seed = random.getrandbits(64)
+        self.last_key = None
+        self.sent = 0 # Links sent in this cycle
+
+class SendRotations:
+    """SendRotations by (query, channel ID), least recently used first; at most max_rotations are remembered."""
+
+    def __init__(self, max_rotations: int):
+        self.max_rotations = max_rotations
+        self.rotations = OrderedDict()
+        self.cycles_completed = 0
+
+    @staticmethod
+    def rotation_for(search_terms: list, channel_id: int):
+        """Rotation key: the same terms in any order or case share a rotation."""
+        return tuple(sorted({term.lower() for term in search_terms})), channel_id
+
+    def take(self, key, matching_links: list, count: int):
+        """
+        Picks up to count different links from matching_links that the rotation for key has not sent in its
+        current cycle, in rotation order. When the cycle runs out, a new one starts (in a new random order).
+        Returns (picked links, whether a new cycle was started). O(len(matching_links) * log(count)).
+        """
+        rotation = self.rotations.pop(key, None) or SendRotation()
+        self.rotations[key] = rotation
+        while len(self.rotations) > self.max_rotations:
+            self.rotations.popitem(last=False)
+
+        picked = []
+        restarted = False
+        while len(picked) < count:
+            seed, last_key = rotation.seed, rotation.last_key
+            keys = (rotation_key(seed, link) for link in matching_links)
+            if last_key is not None:
+                keys = (k for k in keys if k > last_key)
+            if restarted:
+                keys = (k for k in keys if k[1] not in picked) # Not twice in one command
+            upcoming = heapq.nsmallest(count - len(picked), keys)
+            if upcoming:
+                picked.extend(link for _, link in upcoming)
+                rotation.last_key = upcoming[-1]
+                rotation.sent += len(upcoming)
+            elif rotation.sent and not restarted:
+                rotation.new_cycle() # Every match was sent: start over in a new order
+                self.cycles_completed += 1
+                restarted = True
+            else:
+                break
+        return picked, restarted
+
+    def stats_line(self):
+        """One-line summary for `#status`."""
+        return f"{len(self.rotations)} active, {self.cycles_completed} completed"
+
+send_rotations = SendRotations(SENDLINK_MAX_ROTATIONS)
 
-async def dispatch_random_match(ctx, search_query_original: str, target_channel_obj: discord.TextChannel, matching_links: list):
+@perf_timed("sendlink.dispatch")
+async def dispatch_random_match(ctx, search_query_original: str, target_channel_obj: discord.TextChannel, matching_links: list,
+                                confirm=None, count: int = 1):
     """
-    Internal helper: Sends a random match from the provided list of matching links
-    to the specified channel object.
+    Internal helper: Sends count different matches from the provided list of matching links
+    to the specified channel object (through the outbound send queues). Matches are picked by the
+    (query, channel) rotation in send_rotations, so the same link is not sent again before all the others were.
+    The confirmation goes to confirm(text) if given (e.g., a slash command's reply), otherwise to ctx's channel.
     """
     if not matching_links:
         await ctx.send(f"No kits found matching '{search_query_original}' in the loaded list. This should not happen if called correctly.")
         return
 
-    random_match = random.choice(matching_links)
+    rotation = SendRotations.rotation_for(search_query_original.split(), target_channel_obj.id)
+    picked_links, restarted = send_rotations.take(rotation, matching_links, count)
 
     try:
-        await target_channel_obj.send(f"**Kit found for '{search_query_original}'**: {random_match}")
-        await ctx.send(f"Dispatched link for '{search_query_original}' to {target_channel_obj.mention}.")
-        print(f"Sent search result '{random_match}' to #{target_channel_obj.name} for keyword '{search_query_original}'.")
+        # Sent together, so the channel's send queue merges them into as few messages as possible
+        await asyncio.gather(*(
+            outbound.send(target_channel_obj, f"**Kit found for '{search_query_original}'**: {link}") for link in picked_links
+        ))
+        if len(picked_links) == 1:
+            confirmation = f"Dispatched link for '{search_query_original}' to {target_channel_obj.mention}."
+        else:
+            confirmation = f"Dispatched {len(picked_links)} links for '{search_query_original}' to {target_channel_obj.mention}."
+        if len(picked_links) < count:
+            confirmation += f" Only {len(picked_links)} different matches exist."
+        elif restarted:
+            confirmation += f" (All {len(matching_links)} matches have been sent there now, starting over in a new order.)"
+        if confirm is not None:
+            await confirm(confirmation)
+        elif target_channel_obj.id != ctx.channel.id or len(picked_links) < count or restarted:
+            # (A plain single link already confirms itself in the same channel)
+            await outbound.send(ctx.channel, confirmation)
+        for link in picked_links:
+            print(f"Sent search result '{link}' to #{target_channel_obj.name} for keyword '{search_query_original}'.")
     except discord.Forbidden:
         await ctx.send(f"ERROR: I lack permissions to send messages to {target_channel_obj.mention}.")
         print(f"ERROR: No permission to send messages to channel #{target_channel_obj.name} ({target_channel_obj.id}).")
@@ -219,6 +2501,937 @@ async def dispatch_random_match(ctx, search_query_original: str, target_channel_
         print(f"ERROR: Failed to send link to channel #{target_channel_obj.name} ({target_channel_obj.id}): {e}")
 
 
+# --- Search Result Cache ---
+
+class QueryResultCache:
+    """
+    Bounded LRU cache of search results with a TTL.
+    Every entry is stamped with the index generation it was computed from; an entry from an older
+    generation (i.e., before a reload) is never returned. Counters are shown by `#status`.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict() # key -> (generation, stored_at, result), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, generation: int):
+        """Returns the cached result for key, or None if missing, expired or from another generation."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry_generation, stored_at, result = entry
+            if entry_generation == generation and time.monotonic() - stored_at <= self.ttl_seconds:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self.entries[key] # Stale: computed before a reload, or too old
+        self.misses += 1
+        return None
+
+    def put(self, key, generation: int, result):
+        """Stores result for key, evicting the least recently used entries beyond max_entries."""
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (generation, time.monotonic(), result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every entry (counters are kept)."""
+        self.entries.clear()
+
+    def stats_line(self):
+        """One-line summary of the cache counters for `#status`."""
+        lookups = self.hits + self.misses
+        hit_rate = f"{self.hits / lookups:.0%}" if lookups else "n/a"
+        return (f"{len(self.entries)}/{self.max_entries} entries, {self.hits} hits, {self.misses} misses "
+                f"({hit_rate} hit rate), {self.evictions} evictions")
+
+search_result_cache = QueryResultCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+
+def search_cache_key(search_function, args: tuple):
+    """
+    Normalized cache key for a search: keyword lists are lowercased and sorted,
+    since neither matching nor ranking depends on keyword order.
+    """
+    normalized = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            normalized.append(tuple(sorted(str(x).lower() for x in arg)))
+        else:
+            normalized.append(arg)
+    return (search_function.__name__, *normalized)
+
+# --- Search Admission ---
+
+class SearchBusy(Exception):
+    """Raised when a search is turned away by admission control (see SearchAdmission)."""
+
+class SearchAdmission:
+    """
+    Admission control for searches. A requester is (user ID, guild ID); every user may have at most
+    per_user searches running or waiting, and every guild at most per_guild searches running.
+    Searches that can't run yet wait in one FIFO line of at most queue_size entries; beyond that
+    (or beyond the user's limit) they are rejected right away with SearchBusy, so bursts get a fast
+    "busy" answer instead of piling up behind each other. Counters are shown by `#status`.
+    """
+
+    def __init__(self, per_user: int, per_guild: int, queue_size: int):
+        self.per_user = per_user
+        self.per_guild = per_guild
+        self.queue_size = queue_size
+        self.user_load = Counter() # user ID -> searches running or waiting
+        self.guild_running = Counter() # guild ID -> searches running
+        self.guild_waiting = Counter() # guild ID -> searches waiting in line
+        self.waiting = deque() # Tickets waiting in line, oldest first
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.coalesced = 0
+
+    def enter(self, requester: tuple):
+        """
+        Registers a search for requester. Returns a ticket to pass to wait_turn() and leave().
+        Raises SearchBusy if the user is at their limit or the line is full.
+        """
+        user_id, guild_id = requester
+        if self.user_load[user_id] >= self.per_user:
+            self.rejected += 1
+            raise SearchBusy(f"user {user_id} already has {self.per_user} searches running")
+        # A ticket: [user ID, guild ID, future set when it may run (None = running right away)]
+        if self.guild_running[guild_id] < self.per_guild and not self.guild_waiting[guild_id]:
+            ticket = [user_id, guild_id, None]
+            self.guild_running[guild_id] += 1
+        elif len(self.waiting) < self.queue_size:
+            ticket = [user_id, guild_id, asyncio.get_running_loop().create_future()]
+            self.waiting.append(ticket)
+            self.guild_waiting[guild_id] += 1
+            self.queued += 1
+        else:
+            self.rejected += 1
+            raise SearchBusy(f"{len(self.waiting)} searches are already waiting")
+        self.user_load[user_id] += 1
+        self.admitted += 1
+        return ticket
+
+    async def wait_turn(self, ticket: list):
+        """Waits until ticket's search may run."""
+        if ticket[2] is not None:
+            await ticket[2]
+
+    def leave(self, ticket: list):
+        """The ticket's search finished (or was cancelled): frees its place and starts the next ones in line."""
+        user_id, guild_id, turn = ticket
+        self.user_load[user_id] -= 1
+        if self.user_load[user_id] <= 0:
+            del self.user_load[user_id]
+        if ticket in self.waiting:
+            # Cancelled while still waiting in line (its future is usually cancelled already)
+            self.waiting.remove(ticket)
+            self.guild_waiting[guild_id] -= 1
+            turn.cancel()
+        else:
+            self.guild_running[guild_id] -= 1
+            for waiting_ticket in list(self.waiting):
+                waiting_guild = waiting_ticket[1]
+                if waiting_ticket[2].done(): # Cancelled, its own leave() takes it out of the line
+                    continue
+                if self.guild_running[waiting_guild] < self.per_guild:
+                    self.waiting.remove(waiting_ticket)
+                    self.guild_waiting[waiting_guild] -= 1
+                    self.guild_running[waiting_guild] += 1
+                    waiting_ticket[2].set_result(None)
+        # Drop guilds with nothing running or waiting, so the counters don't grow with the number of guilds
+        self.guild_running += Counter()
+        self.guild_waiting += Counter()
+
+    def stats_line(self):
+        """One-line summary of the admission counters for `#status`."""
+        return (f"{sum(self.guild_running.values())} running, {len(self.waiting)} waiting, {self.admitted} admitted "
+                f"({self.queued} queued), {self.coalesced} coalesced, {self.rejected} rejected as busy")
+
+search_admission = SearchAdmission(SEARCH_MAX_PER_USER, SEARCH_MAX_PER_GUILD, SEARCH_QUEUE_SIZE)
+search_in_flight = {} # (cache key, index generation) -> future of the search computing it right now
+
+def search_requester(ctx):
+    """The (user ID, guild ID) a command's searches are counted against by search_admission."""
+    return ctx.author.id, getattr(ctx.guild, "id", None)
+
+# --- Keyword Autocomplete ---
+
+# Discord shows at most 25 autocomplete choices, each at most 100 characters long
+AUTOCOMPLETE_MAX_CHOICES = 25
+AUTOCOMPLETE_MAX_CHOICE_LENGTH = 100
+
+class KeywordSuggester:
+    """
+    Prefix autocomplete over an index's token vocabulary (the words get_clean_url_path leaves in link paths),
+    ranked by document frequency so the most useful keywords come first.
+    The vocabulary is a sorted array searched with bisect: for a mapped snapshot that is the snapshot's own
+    sorted token keys (nothing is copied), otherwise a sorted list built once per reload. Over a mapped
+    snapshot with links added since (see OverlayPostings), the words of those links are kept in a second
+    sorted list, `added_words`, and their counts are looked up in the index. The SQLite backend is asked
+    directly instead (its vocabulary never leaves the database).
+    Answers for short prefixes, which match many words, are cached.
+    """
+
+    MAX_CACHED_PREFIXES = 4096
+
+    def __init__(self, index: SearchBackend):
+        self.cache = {}
+        self.index = index
+        self.added_words = []
+        self.database = index if isinstance(index, SqliteLinkIndex) else None
+        if self.database is not None:
+            return # The vocabulary stays in the database (see SqliteLinkIndex.frequent_tokens)
+        token_postings = index.token_postings
+        if isinstance(token_postings, OverlayPostings):
+            self.added_words = sorted(token_postings.delta)
+            token_postings = token_postings.base
+        if isinstance(token_postings, MappedPostings):
+            self.keys = token_postings.keys # Already sorted (by UTF-8 bytes = by code point, like str comparison)
+            offsets = token_postings.posting_offsets
+            self.frequency = lambda i: offsets[i + 1] - offsets[i]
+        else:
+            self.keys = sorted(token_postings)
+            frequencies = array('I', (index.document_frequency(token) for token in self.keys))
+            self.frequency = frequencies.__getitem__
+
+    def suggest(self, prefix: str, limit: int = AUTOCOMPLETE_MAX_CHOICES):
+        """Returns up to limit vocabulary words starting with prefix, most frequent first."""
+        prefix = prefix.lower()
+        cached = self.cache.get(prefix)
+        if cached is None and self.database is not None:
+            cached = self.database.frequent_tokens(prefix, AUTOCOMPLETE_MAX_CHOICES)
+        elif cached is None:
+            first = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + "\U0010ffff", first) # Past the last word starting with prefix
+            added_first = bisect.bisect_left(self.added_words, prefix)
+            added = self.added_words[added_first:bisect.bisect_left(self.added_words, prefix + "\U0010ffff", added_first)]
+            frequency = self.frequency
+            # Enough of the snapshot's best words that the added words' new counts can't push the real best out
+            best = heapq.nlargest(
+                AUTOCOMPLETE_MAX_CHOICES + len(added), ((frequency(i), -i) for i in range(first, end) if frequency(i))
+            )
+            cached = [self.keys[-negative_i] for _, negative_i in best]
+            if added:
+                added_set = set(added)
+                ranked = [(count, word) for (count, _), word in zip(best, cached) if word not in added_set]
+                ranked += [(self.index.document_frequency(word), word) for word in added]
+                ranked.sort(key=lambda count_word: (-count_word[0], count_word[1]))
+                cached = [word for count, word in ranked[:AUTOCOMPLETE_MAX_CHOICES] if count]
+        if prefix not in self.cache:
+            if len(self.cache) >= self.MAX_CACHED_PREFIXES:
+                self.cache.clear()
+            self.cache[prefix] = cached
+        return cached[:limit]
+
+def suggest_search_queries(current: str):
+    """
+    Autocomplete choices for a whole search query: the last word is completed from the keyword vocabulary
+    (or, after `scope:`, from the scope names), keeping the words typed before it.
+    Returns a list of full query strings.
+    """
+    typed, _, last_word = current.rpartition(" ")
+    before = f"{typed} " if typed else ""
+    if last_word.lower().startswith("scope:"):
+        scope_prefix = last_word[len("scope:"):].lower()
+        completions = [f"scope:{scope}" for scope in SCOPE_KEYWORDS if scope.startswith(scope_prefix)]
+    elif keyword_suggester is not None and last_word:
+        completions = keyword_suggester.suggest(last_word)
+    else:
+        completions = []
+    queries = [f"{before}{completion}" for completion in completions]
+    return [query for query in queries if len(query) <= AUTOCOMPLETE_MAX_CHOICE_LENGTH]
+
+# --- Search Worker Pool ---
+
+class SearchTimeout(Exception):
+    """Raised when a search runs longer than SEARCH_TIMEOUT_SECONDS."""
+
+# In process-pool workers: the LinkIndex this worker searches (set once by _init_search_worker)
+_worker_link_index = None
+
+def _init_search_worker(index: LinkIndex):
+    """Process pool initializer: keeps the index snapshot the pool was started with."""
+    global _worker_link_index
+    _worker_link_index = index
+
+def _search_in_worker(search_function, args: tuple, time_budget: float):
+    """Runs search_function against this worker process's index snapshot."""
+    return search_function(_worker_link_index, *args, time_budget=time_budget)
+
+def get_search_pool(index: LinkIndex):
+    """
+    Returns the executor searches run on, creating it on first use.
+    Process pools are restarted when the index changes, since every worker holds its own copy.
+    The old pool still finishes the searches queued on it (they were started on its index), then exits.
+    """
+    global search_pool, search_pool_index
+    if SEARCH_EXECUTOR == "process":
+        if search_pool is None or search_pool_index is not index:
+            if search_pool is not None:
+                search_pool.shutdown(wait=False)
+            search_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=SEARCH_WORKERS, initializer=_init_search_worker, initargs=(index,)
+            )
+            search_pool_index = index
+    elif search_pool is None:
+        search_pool = concurrent.futures.ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    return search_pool
+
+def shutdown_search_pool():
+    """Stops the search executor and the shard workers (pending searches are cancelled)."""
+    global search_pool, search_pool_index, sharded_search
+    if search_pool is not None:
+        search_pool.shutdown(wait=False, cancel_futures=True)
+    search_pool = None
+    search_pool_index = None
+    if sharded_search is not None:
+        sharded_search.shutdown()
+    sharded_search = None
+
+# --- Sharded Search ---
+
+# In shard workers: {snapshot_id: MappedLinkIndex} for the snapshot this worker last searched
+_worker_shard_indexes = {}
+
+def _search_shard(path: str, snapshot_id: str, search_function, args: tuple, id_range: tuple, time_budget: float):
+    """
+    Runs search_function on one shard (id_range) of the snapshot at path, in a shard worker process.
+    The snapshot is mapped once per worker and reused until a newer one is searched.
+    """
+    index = _worker_shard_indexes.get(snapshot_id)
+    if index is None:
+        _worker_shard_indexes.clear() # Unmaps the previous snapshot once nothing uses it
+        index = _worker_shard_indexes[snapshot_id] = open_links_snapshot(path, snapshot_id)[0]
+    return search_function(index, *args, time_budget=time_budget, id_range=id_range)
+
+def merge_kit_shards(index: LinkIndex, args: tuple, shard_results: list):
+    """Merges the (total, [(key, link_id), ...]) results of score_kit_matches shards into rank_kit_matches' result."""
+    limit = args[3]
+    total_matches = sum(shard_total for shard_total, _ in shard_results)
+    top = heapq.nlargest(limit, ((key, -link_id) for _, shard_top in shard_results for key, link_id in shard_top))
+    return total_matches, array('I', (-negative_id for _, negative_id in top))
+
+def merge_keyword_shards(index: LinkIndex, args: tuple, shard_results: list):
+    """Merges search_links_by_keyword shards (shards are in link ID order, so this keeps the unsharded order)."""
+    return [url for shard_links in shard_results for url in shard_links]
+
+# Searches that can be sharded: search function -> (function each shard runs, function merging the shards)
+SHARDED_SEARCHES = {
+    rank_kit_matches: (score_kit_matches, merge_kit_shards),
+    search_links_by_keyword: (search_links_by_keyword, merge_keyword_shards),
+}
+
+class ShardedSearchEngine:
+    """
+    Splits each search over `shards` contiguous ranges of link IDs and runs them in parallel in a pool of
+    worker processes (one per shard). Workers map the index snapshot file themselves, so the index is never
+    pickled and all workers share the same pages. Each shard returns its local matches (or local top-k),
+    and the coordinator merges them into exactly what a single-process search returns.
+    Only MappedLinkIndex snapshots can be sharded (an in-memory index lives in this process only).
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        self.pool = None
+
+    def can_search(self, index: LinkIndex, search_function):
+        return isinstance(index, MappedLinkIndex) and search_function in SHARDED_SEARCHES
+
+    def shard_ranges(self, size: int):
+        """Splits link IDs 0..size-1 into at most `shards` ranges (first, end) of (almost) equal size."""
+        step = max(1, -(-size // self.shards))
+        return [(first, min(size, first + step)) for first in range(0, size, step)]
+
+    def submit(self, index: MappedLinkIndex, search_function, args: tuple, time_budget: float = None):
+        """Starts search_function(index, *args) on every shard. Returns one concurrent future per shard."""
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.shards)
+        shard_function = SHARDED_SEARCHES[search_function][0]
+        return [
+            self.pool.submit(_search_shard, index.path, index.snapshot_id, shard_function, args, id_range, time_budget)
+            for id_range in self.shard_ranges(index.size)
+        ]
+
+    def merge(self, index: MappedLinkIndex, search_function, args: tuple, shard_results: list):
+        return SHARDED_SEARCHES[search_function][1](index, args, shard_results)
+
+    def search(self, index: MappedLinkIndex, search_function, *args, time_budget: float = None):
+        """Blocking sharded search (for scripts and the benchmark)."""
+        futures = self.submit(index, search_function, args, time_budget)
+        return self.merge(index, search_function, args, [future.result() for future in futures])
+
+    async def run(self, index: MappedLinkIndex, search_function, args: tuple, timeout: float):
+        """Sharded search awaited from the event loop. Raises SearchTimeout after timeout seconds."""
+        futures = self.submit(index, search_function, args, timeout)
+        try:
+            shard_results = await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in futures)), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise SearchTimeout(f"{search_function.__name__}{args} exceeded {timeout}s on {len(futures)} shards")
+        finally:
+            for future in futures:
+                future.cancel() # Shards still queued are dropped (no-op for finished ones)
+        return self.merge(index, search_function, args, shard_results)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = None
+
+def get_sharded_search(index: LinkIndex, search_function):
+    """Returns the ShardedSearchEngine if SEARCH_SHARDS > 1 and this search can be sharded, else None."""
+    global sharded_search
+    if SEARCH_SHARDS <= 1:
+        return None
+    if sharded_search is None:
+        sharded_search = ShardedSearchEngine(SEARCH_SHARDS)
+    return sharded_search if sharded_search.can_search(index, search_function) else None
+
+async def run_search(search_function, *args, requester: tuple = None):
+    """
+    Runs search_function(index, *args) on the search executor without blocking the event loop.
+    The index snapshot is taken once here; reloads swap `link_index` but never modify a built index,
+    so the search sees one consistent view. Raises SearchTimeout after SEARCH_TIMEOUT_SECONDS.
+    A timed-out or cancelled search also stops itself inside the worker via its time budget.
+    Results are served from / stored in search_result_cache, stamped with the index generation.
+    Identical searches already running (single-flight) are joined instead of being run again.
+    New searches for requester (see search_requester) go through search_admission first,
+    which may make them wait in line or raise SearchBusy.
+    With SEARCH_SHARDS > 1 and a mapped index, the search is split over the shard workers instead.
+    Callers must not modify the returned list, since it may be shared with the cache.
+    """
+    index, generation = link_index, index_generation
+    cache_key = search_cache_key(search_function, args)
+    cached = search_result_cache.get(cache_key, generation)
+    if cached is not None:
+        perf_count("search.cache_hits")
+        return cached
+
+    flight_key = (cache_key, generation)
+    shared = search_in_flight.get(flight_key)
+    if shared is None:
+        ticket = None if requester is None else search_admission.enter(requester)
+        shared = asyncio.ensure_future(_run_admitted_search(ticket, index, generation, cache_key, search_function, args))
+        search_in_flight[flight_key] = shared
+
+        def search_done(future):
+            search_in_flight.pop(flight_key, None)
+            if not future.cancelled():
+                future.exception() # Mark the error as seen even if every caller gave up waiting
+
+        shared.add_done_callback(search_done)
+    else:
+        search_admission.coalesced += 1
+        perf_count("search.coalesced")
+    # Shielded: one caller giving up (e.g., its command being cancelled) doesn't cancel the others' search
+    return await asyncio.shield(shared)
+
+async def _run_admitted_search(ticket, index: LinkIndex, generation: int, cache_key, search_function, args: tuple):
+    """The actual search behind run_search, once admission control lets it run (ticket None = not admission-controlled)."""
+    try:
+        if ticket is not None:
+            with perf_span("search.queue_wait"): # Time spent in admission control's line (about 0 when admitted right away)
+                await search_admission.wait_turn(ticket)
+        return await _execute_search(index, generation, cache_key, search_function, args)
+    finally:
+        if ticket is not None:
+            search_admission.leave(ticket)
+
+async def _execute_search(index: LinkIndex, generation: int, cache_key, search_function, args: tuple):
+    """Runs the search on the shard workers or the search executor; the run itself is timed as span "search.run"."""
+    engine = get_sharded_search(index, search_function)
+    if engine is not None:
+        try:
+            with perf_span("search.run"):
+                result = await engine.run(index, search_function, args, SEARCH_TIMEOUT_SECONDS)
+            search_result_cache.put(cache_key, generation, result)
+            return result
+        except ValueError as e:
+            # The snapshot file was replaced by a newer one mid-search: search this snapshot in-process instead
+            print(f"WARNING: Sharded search fell back to a single search: {e}")
+
+    loop = asyncio.get_running_loop()
+    pool = get_search_pool(index)
+    if SEARCH_EXECUTOR == "process":
+        call = functools.partial(_search_in_worker, search_function, args, SEARCH_TIMEOUT_SECONDS)
+    else:
+        call = functools.partial(search_function, index, *args, time_budget=SEARCH_TIMEOUT_SECONDS)
+    try:
+        with perf_span("search.run"):
+            result = await asyncio.wait_for(loop.run_in_executor(pool, call), timeout=SEARCH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise SearchTimeout(f"{search_function.__name__}{args} exceeded {SEARCH_TIMEOUT_SECONDS}s")
+    search_result_cache.put(cache_key, generation, result)
+    return result
+
+@perf_timed("links.load")
+async def refresh_link_index(force_full: bool = False):
+    """
+    Ingests links appended to LINKS_FILES since the last load (or reloads everything if force_full,
+    on first load, or when a file was rewritten) in a background thread, then publishes the new index
+    snapshot with a single atomic swap. Searches already running keep using the snapshot they started with.
+    Bumps index_generation so cached results from the previous index are never served again, and
+    link_ids_epoch only after a full reload: appended links get new IDs, so open result pages stay valid.
+    The compiled snapshot is brought up to date right after a full reload, and at most every
+    LINKS_SNAPSHOT_SAVE_INTERVAL_SECONDS after appends (see save_link_snapshot).
+    Returns (number of links added, whether it was a full reload).
+    """
+    global all_loaded_links, link_index, index_generation, link_ids_epoch, keyword_suggester, snapshot_outdated_since
+    async with link_reload_lock: # One reload at a time, the reloader's file state is not thread-safe
+        loop = asyncio.get_running_loop()
+        previous_index = link_index
+        new_index, added, full_reload = await loop.run_in_executor(None, link_reloader.refresh, previous_index, force_full)
+        if new_index is not previous_index:
+            all_loaded_links, link_index = new_index.records, new_index
+            perf_metrics.gauge("corpus_links", len(new_index))
+            index_generation += 1
+            search_result_cache.clear()
+            if full_reload:
+                link_ids_epoch += 1
+                result_cursors.prune(link_ids_epoch) # Their link IDs may point at other links now
+            if not isinstance(new_index, MappedLinkIndex) and snapshot_outdated_since is None:
+                snapshot_outdated_since = time.monotonic()
+        # A SQLite database already holds the new links (only its file states are saved), so it is never held back.
+        # Shard workers only search the mapped snapshot, so with sharding appends are saved (and re-mapped) right away.
+        save_now = full_reload or isinstance(link_index, SqliteLinkIndex) or SEARCH_SHARDS > 1
+        if snapshot_outdated_since is not None and (save_now or time.monotonic() - snapshot_outdated_since >= LINKS_SNAPSHOT_SAVE_INTERVAL_SECONDS):
+            await save_link_snapshot()
+        if SLASH_COMMANDS_ENABLED and link_index is not previous_index:
+            keyword_suggester = await loop.run_in_executor(None, KeywordSuggester, link_index)
+    return added, full_reload
+
+async def save_link_snapshot():
+    """
+    Saves link_index to the compiled snapshot (after publishing it, so searches don't wait), then switches
+    to the mapped copy of the same links: the in-memory index and its overlays can be freed, and shard and
+    process pool workers map that file. Callers hold link_reload_lock, so link_index and the reloader match.
+    """
+    global all_loaded_links, link_index, snapshot_outdated_since
+    loop = asyncio.get_running_loop()
+    snapshot_outdated_since = None
+    index = link_index
+    saved = await loop.run_in_executor(None, link_reloader.save_snapshot, index)
+    if saved and LINKS_SNAPSHOT_FILE and isinstance(index, LinkIndex):
+        try:
+            mapped_index, _ = await loop.run_in_executor(None, open_links_snapshot, LINKS_SNAPSHOT_FILE)
+            if len(mapped_index) == len(index):
+                # Same links with the same IDs, so cached results and result pages stay valid
+                all_loaded_links, link_index = mapped_index.records, mapped_index
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Could not map '{LINKS_SNAPSHOT_FILE}', searching the in-memory index: {e}")
+
+async def watch_links_files():
+    """Background task: polls LINKS_FILES every LINKS_WATCH_INTERVAL_SECONDS and ingests appended links."""
+    while True:
+        await asyncio.sleep(LINKS_WATCH_INTERVAL_SECONDS)
+        try:
+            added, full_reload = await refresh_link_index()
+            if added:
+                print(f"[WATCHER] {'Reloaded' if full_reload else 'Added'} {added} links. Now searching {len(link_index)} links.")
+        except Exception as e:
+            print(f"ERROR: Links file watcher failed to reload: {e}")
+
+
+# --- Outbound Delivery ---
+
+# Discord message limits
+DISCORD_MAX_MESSAGE_CHARS = 2000
+DISCORD_MAX_EMBEDS_PER_MESSAGE = 10
+DISCORD_MAX_EMBED_CHARS_PER_MESSAGE = 6000 # Titles, descriptions, fields and footers of all embeds together
+
+def pack_embed_messages(embeds: list, notice: str = None):
+    """
+    Packs embeds into as few messages as Discord allows (10 embeds and 6000 embed characters per message).
+    notice (e.g., the "more matches" line) becomes the text of the last message instead of a message of its own.
+    Returns a list of (content, embeds) pairs, one per message.
+    """
+    messages = []
+    batch, batch_chars = [], 0
+    for embed in embeds:
+        if batch and (len(batch) == DISCORD_MAX_EMBEDS_PER_MESSAGE or batch_chars + len(embed) > DISCORD_MAX_EMBED_CHARS_PER_MESSAGE):
+            messages.append((None, batch))
+            batch, batch_chars = [], 0
+        batch.append(embed)
+        batch_chars += len(embed)
+    if batch or notice:
+        messages.append((notice, batch))
+    return messages
+
+class ChannelSendQueue:
+    """
+    Sends messages to one channel in order, at most `rate` messages every `per` seconds.
+    Text-only messages waiting in the queue together are coalesced into one message when they fit.
+    If Discord still answers "rate limited", the send is retried after the time it asks for
+    (or an exponential back-off), up to `max_retries` times.
+    The channel can be anything with an async `send(content=..., embeds=..., view=...)` (a fake channel in tests).
+    """
+
+    def __init__(self, channel, rate: int, per: float, max_retries: int):
+        self.channel = channel
+        self.rate = rate
+        self.per = per
+        self.max_retries = max_retries
+        self.pending = deque() # (content, embeds, view, future) waiting to be sent
+        self.sent_at = deque() # Times of the last `rate` sends, oldest first
+        self.worker = None
+        self.sent = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def send(self, content: str = None, embeds: list = None, view: discord.ui.View = None):
+        """Queues a message (with buttons, if view is given). Returns a future resolved with the sent discord.Message (or its exception)."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((content, embeds or [], view, future))
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._drain())
+        return future
+
+    def _next_message(self):
+        """Takes the next message off the queue, merging the text-only messages right behind a text-only one."""
+        content, embeds, view, future = self.pending.popleft()
+        futures = [future]
+        if not embeds and view is None:
+            while self.pending and not self.pending[0][1] and self.pending[0][2] is None and self.pending[0][0]:
+                next_content = self.pending[0][0]
+                if len(content) + 1 + len(next_content) > DISCORD_MAX_MESSAGE_CHARS:
+                    break
+                content = f"{content}\n{next_content}"
+                futures.append(self.pending.popleft()[3])
+            self.coalesced += len(futures) - 1
+        return content, embeds, view, futures
+
+    async def _wait_for_rate_limit(self):
+        """Sleeps until one more message fits in the per-channel rate window."""
+        while len(self.sent_at) >= self.rate:
+            wait = self.sent_at[0] + self.per - time.monotonic()
+            if wait <= 0:
+                self.sent_at.popleft()
+                continue
+            self.throttled += 1
+            await asyncio.sleep(wait)
+
+    async def _send_with_retries(self, content: str, embeds: list, view: discord.ui.View = None):
+        backoff = 1.0
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_rate_limit()
+            self.sent_at.append(time.monotonic())
+            try:
+                with perf_span("discord.send"):
+                    return await self.channel.send(content=content, embeds=embeds, view=view)
+            except discord.RateLimited as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == self.max_retries:
+                    raise
+                delay = backoff
+            self.retries += 1
+            perf_count("discord.send_retries")
+            await asyncio.sleep(delay)
+            backoff *= 2
+
+    async def _drain(self):
+        while self.pending:
+            content, embeds, view, futures = self._next_message()
+            try:
+                message = await self._send_with_retries(content, embeds, view)
+                self.sent += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_result(message)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+class OutboundDelivery:
+    """One ChannelSendQueue per channel (by channel ID), created on first use."""
+
+    def __init__(self, rate: int, per: float, max_retries: int):
+        self.rate = rate
+        self.per = per
+        self.max_retries = max_retries
+        self.queues = {}
+
+    def queue_for(self, channel):
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = ChannelSendQueue(channel, self.rate, self.per, self.max_retries)
+        else:
+            queue.channel = channel # Keep the newest channel object (e.g., after a channel update)
+        return queue
+
+    async def send(self, channel, content: str = None, embeds: list = None):
+        """Sends one message to channel through its queue. Returns the discord.Message."""
+        return await self.queue_for(channel).send(content, embeds)
+
+    async def send_embeds(self, channel, embeds: list, notice: str = None, view: discord.ui.View = None):
+        """
+        Sends embeds (plus an optional notice line) to channel in as few messages as possible.
+        view (buttons) goes on the last message. Returns the sent messages.
+        """
+        queue = self.queue_for(channel)
+        messages = pack_embed_messages(embeds, notice)
+        futures = [
+            queue.send(content, batch, view if position == len(messages) - 1 else None)
+            for position, (content, batch) in enumerate(messages)
+        ]
+        return await asyncio.gather(*futures)
+
+    def stats_line(self):
+        """One-line summary of the send counters for `#status`."""
+        queues = self.queues.values()
+        return (f"{sum(q.sent for q in queues)} messages sent, {sum(q.coalesced for q in queues)} coalesced, "
+                f"{sum(q.throttled for q in queues)} throttled waits, {sum(q.retries for q in queues)} retries, "
+                f"{sum(len(q.pending) for q in queues)} queued")
+
+outbound = OutboundDelivery(SEND_RATE_MESSAGES, SEND_RATE_SECONDS, SEND_MAX_RETRIES)
+
+
+# --- Result Pages ---
+
+EMBED_LINK_LIMIT = 10 # Links per result embed (safe number per embed)
+
+class ResultCursor:
+    """
+    A `#searchkit` result set kept for paging: the selected link IDs (array('I'), best first) and the
+    link_ids_epoch they belong to, plus the query to show above them. Pages are rebuilt from the index,
+    so turning one never searches again. page_starts holds the position of the first link of every page
+    reached so far (a page ends where its links stop fitting in one message).
+    """
+    __slots__ = ("cursor_id", "ids_epoch", "link_ids", "keywords", "scope", "search_mode", "total_matches", "page", "page_starts")
+
+    def __init__(self, cursor_id: int, ids_epoch: int, link_ids, keywords: list, scope: str, search_mode: str, total_matches: int):
+        self.cursor_id = cursor_id
+        self.ids_epoch = ids_epoch
+        self.link_ids = link_ids
+        self.keywords = keywords
+        self.scope = scope
+        self.search_mode = search_mode
+        self.total_matches = total_matches
+        self.page = 0
+        self.page_starts = [0]
+
+    def has_next(self):
+        return len(self.page_starts) > self.page + 1 and self.page_starts[self.page + 1] < len(self.link_ids)
+
+    def next(self):
+        if self.has_next():
+            self.page += 1
+
+    def previous(self):
+        self.page = max(0, self.page - 1)
+
+    def shuffle(self):
+        """Puts the results in a new random order and goes back to the first page."""
+        random.shuffle(self.link_ids)
+        self.page = 0
+        self.page_starts = [0]
+
+class ResultCursorStore:
+    """
+    The open ResultCursors by ID, least recently used first. A cursor expires ttl_seconds after it was last
+    used, as soon as link_ids_epoch changes (a full reload renumbers the links; appends keep the IDs), or when the open cursors
+    hold more than max_links link IDs together (the least recently used ones go first). Counters are shown by `#status`.
+    """
+
+    def __init__(self, ttl_seconds: float, max_links: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_links = max_links
+        self.cursors = OrderedDict() # cursor_id -> (last used, ResultCursor), least recently used first
+        self.stored_links = 0
+        self.last_id = 0
+        self.pages_turned = 0
+        self.expired = 0
+
+    def open(self, ids_epoch: int, link_ids, keywords: list, scope: str, search_mode: str, total_matches: int):
+        """Stores a copy of link_ids (it may be a cached search result) as a new cursor and returns it."""
+        self.last_id += 1
+        cursor = ResultCursor(self.last_id, ids_epoch, array('I', link_ids), keywords, scope, search_mode, total_matches)
+        self.cursors[cursor.cursor_id] = (time.monotonic(), cursor)
+        self.stored_links += len(cursor.link_ids)
+        while self.stored_links > self.max_links and len(self.cursors) > 1:
+            self.close(next(iter(self.cursors)))
+            self.expired += 1
+        return cursor
+
+    def get(self, cursor_id: int, ids_epoch: int):
+        """Returns the cursor (marking it used), or None if it expired or its link IDs are from another epoch."""
+        entry = self.cursors.get(cursor_id)
+        if entry is None:
+            return None
+        used_at, cursor = entry
+        now = time.monotonic()
+        if cursor.ids_epoch != ids_epoch or now - used_at > self.ttl_seconds:
+            self.close(cursor_id)
+            self.expired += 1
+            return None
+        self.cursors[cursor_id] = (now, cursor)
+        self.cursors.move_to_end(cursor_id)
+        return cursor
+
+    def close(self, cursor_id: int):
+        entry = self.cursors.pop(cursor_id, None)
+        if entry is not None:
+            self.stored_links -= len(entry[1].link_ids)
+
+    def prune(self, ids_epoch: int):
+        """Drops the cursors that can't be used anymore (e.g., after a full reload) to free their memory right away."""
+        now = time.monotonic()
+        for cursor_id, (used_at, cursor) in list(self.cursors.items()):
+            if cursor.ids_epoch != ids_epoch or now - used_at > self.ttl_seconds:
+                self.close(cursor_id)
+                self.expired += 1
+
+    def stats_line(self):
+        """One-line summary for `#status`."""
+        return (f"{len(self.cursors)} open ({self.stored_links} links), {self.pages_turned} pages turned, "
+                f"{self.expired} expired")
+
+result_cursors = ResultCursorStore(RESULT_CURSOR_TTL_SECONDS, RESULT_CURSOR_MAX_LINKS)
+
+def build_result_page(cursor: ResultCursor, urls: list, reposts: list = None):
+    """
+    Builds the embeds for the cursor's current page, given the URLs of the links from its first one on
+    and, when grouping near-duplicates, how many reposts were grouped with each (see load_result_page):
+    up to MAX_SEARCH_RESULTS_DISPLAY links, EMBED_LINK_LIMIT per embed, and fewer
+    if they would not all fit in one message (so the page can be edited in place).
+    Records where the next page starts. Returns the list of embeds.
+    """
+    link_ids = cursor.link_ids
+    start = cursor.page_starts[cursor.page]
+    end = min(len(link_ids), start + MAX_SEARCH_RESULTS_DISPLAY)
+
+    def footer_text(last: int):
+        return (
+            f"Page {cursor.page + 1} • Results {start + 1}-{last} of {len(link_ids)} • Use more keywords to narrow results • " + (
+                "Results are randomly sampled, favoring the best matches" if SEARCH_SELECTION_POLICY == "weighted" else "Best matches first"
+            )
+        )
+
+    footer_chars = len(footer_text(end)) # The real footers are never longer (the last result shown is at most `end`)
+    embeds = []
+    message_chars = 0
+    position = start
+    while position < end:
+        if not embeds or len(embeds[-1].fields) == EMBED_LINK_LIMIT:
+            if len(embeds) == DISCORD_MAX_EMBEDS_PER_MESSAGE:
+                break
+            embed = discord.Embed(
+                title="🎧 Kit Search Results",
+                description=(
+                    f"**Query:** `{ ' '.join(cursor.keywords) }`\n"
+                    f"**Scope:** `{cursor.scope}`\n"
+                    f"**Mode:** `{cursor.search_mode}`\n"
+                    f"**Total Matches:** `{cursor.total_matches}`"
+                ),
+                color=discord.Color.dark_purple()
+            )
+            if embeds and message_chars + len(embed) + footer_chars > DISCORD_MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            embeds.append(embed)
+            message_chars += len(embed) + footer_chars
+        name = f"Result #{position + 1}"
+        value = f"[Click to access kit]({urls[position - start]})"
+        if reposts and reposts[position - start]:
+            count = reposts[position - start]
+            value += f" • {count} repost{'s' if count > 1 else ''} grouped"
+        if position > start and message_chars + len(name) + len(value) > DISCORD_MAX_EMBED_CHARS_PER_MESSAGE:
+            break
+        embeds[-1].add_field(name=name, value=value, inline=False)
+        message_chars += len(name) + len(value)
+        position += 1
+
+    if not embeds[-1].fields: # Started an embed that nothing fit into
+        embeds.pop()
+    for embed in embeds:
+        embed.set_footer(text=footer_text(position))
+    del cursor.page_starts[cursor.page + 1:]
+    cursor.page_starts.append(position)
+    return embeds
+
+async def load_result_page(index: SearchBackend, cursor: ResultCursor):
+    """build_result_page for the cursor's current page, with its URLs (and reposts) looked up in index off the event loop."""
+    start = cursor.page_starts[cursor.page]
+    page_ids = cursor.link_ids[start:start + MAX_SEARCH_RESULTS_DISPLAY]
+    records = index.records
+
+    def look_up():
+        reposts = [len(records.variant_urls(link_id)) for link_id in page_ids] if LINKS_GROUP_NEAR_DUPLICATES else None
+        return records.urls(page_ids), reposts
+
+    urls, reposts = await asyncio.get_running_loop().run_in_executor(None, look_up)
+    return build_result_page(cursor, urls, reposts)
+
+def result_page_notice(cursor: ResultCursor):
+    """The text above the result embeds: how many matches are not in the pages at all."""
+    if cursor.total_matches > len(cursor.link_ids):
+        return (
+            f"➕ `{cursor.total_matches - len(cursor.link_ids)}` more matches found.\n"
+            f"Refine your search or use `!sendlink` to pull a random one."
+        )
+    return None
+
+class ResultPagesView(discord.ui.View):
+    """The ◀️ / ▶️ / 🔀 buttons under a `#searchkit` result message: page through (or reshuffle) its ResultCursor."""
+
+    def __init__(self, cursor: ResultCursor):
+        super().__init__(timeout=RESULT_CURSOR_TTL_SECONDS)
+        self.cursor_id = cursor.cursor_id
+        self.message = None # The message the buttons are on, once sent (to remove them when they expire)
+        self.turning = asyncio.Lock() # One page turn at a time (the page's URLs are looked up in between)
+        self.update_buttons(cursor)
+
+    def update_buttons(self, cursor: ResultCursor):
+        self.previous_page.disabled = cursor.page == 0
+        self.next_page.disabled = not cursor.has_next()
+
+    async def turn_page(self, interaction: discord.Interaction, move):
+        """Applies move (a ResultCursor method) and shows the resulting page, or explains that the results expired."""
+        cursor = result_cursors.get(self.cursor_id, link_ids_epoch)
+        if cursor is None or link_index is None:
+            self.stop()
+            await interaction.response.edit_message(view=None)
+            await interaction.followup.send("⌛ These results expired or the links were reloaded. Please search again.", ephemeral=True)
+            return
+        with perf_span("searchkit.page"):
+            async with self.turning:
+                move(cursor)
+                embeds = await load_result_page(link_index, cursor)
+                self.update_buttons(cursor)
+            result_cursors.pages_turned += 1
+            await interaction.response.edit_message(embeds=embeds, view=self)
+
+    @discord.ui.button(emoji="◀️", label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn_page(interaction, ResultCursor.previous)
+
+    @discord.ui.button(emoji="▶️", label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn_page(interaction, ResultCursor.next)
+
+    @discord.ui.button(emoji="🔀", label="Shuffle", style=discord.ButtonStyle.secondary)
+    async def shuffle_pages(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn_page(interaction, ResultCursor.shuffle)
+
+    async def on_timeout(self):
+        result_cursors.close(self.cursor_id)
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass # Message deleted or no longer editable: nothing left to clean up
+
+
 # --- Discord Bot Events ---
 
 @bot.event
@@ -229,11 +3442,28 @@ async def on_ready():
     # Generic admin perm for simplicity, but adjust for specific permissions if needed
     print(f"Invite URL: https://discord.com/oauth2/authorize?client_id={bot.user.id}&permissions=2147483648&scope=bot%20applications.commands") 
 
-    global all_loaded_links
-    all_loaded_links = load_all_links_from_files(LINKS_FILES) # Load from MULTIPLE files
+    # First connect: full load. Reconnects: only pick up lines appended to the files in the meantime.
+    await refresh_link_index()
+
+    global links_watcher_task
+    if LINKS_WATCH_INTERVAL_SECONDS > 0 and (links_watcher_task is None or links_watcher_task.done()):
+        links_watcher_task = asyncio.create_task(watch_links_files())
+
+    global perf_exposition_task
+    if PERF_METRICS_ENABLED and PERF_EXPOSITION_FILE and (perf_exposition_task is None or perf_exposition_task.done()):
+        perf_exposition_task = asyncio.create_task(write_perf_exposition())
     
     await resolve_target_channels() # Resolve channels when bot is ready
 
+    global slash_commands_synced
+    if SLASH_COMMANDS_ENABLED and not slash_commands_synced:
+        try:
+            synced = await bot.tree.sync()
+            slash_commands_synced = True
+            print(f"Registered {len(synced)} slash commands.")
+        except discord.HTTPException as e:
+            print(f"ERROR: Failed to register slash commands: {e}")
+
     if not all_loaded_links:
         print(f"CRITICAL: No links loaded from '{LINKS_FILES}'. Search and send commands will be limited.")
     else:
@@ -252,29 +3482,74 @@ async def on_command_error(ctx, error):
         print(f"An unexpected error occurred: {error}")
         await ctx.send(f"An unknown force briefly resisted my command: `{error}`. I shall overcome!")
 
+# Keep channel_registry (and so resolved_target_channels) current without rescanning every guild
+
+@bot.event
+async def on_guild_channel_create(channel):
+    if isinstance(channel, discord.TextChannel):
+        channel_registry.add_channel(channel)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    if isinstance(channel, discord.TextChannel):
+        channel_registry.remove_channel(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if isinstance(after, discord.TextChannel):
+        channel_registry.update_channel(before, after)
+
+@bot.event
+async def on_guild_join(guild):
+    print(f"Joined guild '{guild.name}' ({guild.id}).")
+    channel_registry.add_guild(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    print(f"Removed from guild '{guild.name}' ({guild.id}).")
+    channel_registry.remove_guild(guild)
+
+@bot.event
+async def on_guild_role_create(role):
+    channel_registry.refresh_permissions(role.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    channel_registry.refresh_permissions(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    channel_registry.refresh_permissions(after.guild)
+
+@bot.event
+async def on_member_update(before, after):
+    if after.id == bot.user.id and before.roles != after.roles: # The bot's own roles changed
+        channel_registry.refresh_permissions(after.guild)
+
 # --- Discord Bot Commands ---
 
-@bot.command(
-    name="searchkit",
-    help=f"Searches for kits by multiple keywords (e.g., 'omnisphere win installer') and displays up to {MAX_SEARCH_RESULTS_DISPLAY} random matches."
-)
-@commands.has_permissions(send_messages=True)
-async def search_kit_command(ctx, *, search_query: str):
+async def run_kit_search(ctx, search_query: str, deliver=None):
     """
-    Searches the loaded links for multiple keywords and displays results
-    using advanced search logic (scope, identity vs content, name precision, platform, ranking).
+    The `#searchkit` / `/searchkit` pipeline: searches the loaded links for multiple keywords and displays
+    results using advanced search logic (scope, identity vs content, name precision, platform, ranking).
+    ctx is a command Context or a SlashContext. Results go through the channel's send queue,
+    or to deliver(embeds, notice, view) if given (which returns the sent messages).
     """
 
     # --- Step 0: Check if links are loaded ---
-    if not all_loaded_links:
+    if not all_loaded_links or link_index is None:
         await ctx.send(
             "❌ **ERROR:** No links loaded. Use `!reloadlinks` after adding link files."
         )
         return
 
+    perf_count("searchkit.queries")
+    command_started = step_started = perf_mark()
+
     # --- Step 1: Parse search query ---
     # Extract keywords and explicit parameters like scope, os, type, format
     primary_keywords, search_params = parse_search_query(search_query)
+    step_started = perf_lap("searchkit.parse", step_started)
 
     if not primary_keywords and "scope" not in search_params:
         await ctx.send("⚠️ Please specify what type of kit you are looking for, e.g., `scope:plugin`")
@@ -284,156 +3559,95 @@ async def search_kit_command(ctx, *, search_query: str):
     scope = search_params.get("scope", None)
     if scope is None:
         # Attempt to infer scope from keywords
-        inferred_scope = None
-        scope_keywords = {
-            "plugin": ["vst", "plugin", "au-aax"],
-            "preset": ["preset", "bank"],
-            "drumkit": ["drum-kit", "drumkit"],
-            "loops": ["loops"],
-            "midi": ["midi"],
-            "installer": ["installer", ".exe", ".dmg", ".pkg"],
-            "expansion": ["expansion"],
-            "crack": ["crack", "patch", "keygen"],
-            "tutorial": ["tutorial"],
-            "tool": ["tool"]
-        }
-        for key, words in scope_keywords.items():
-            if any(word in " ".join(primary_keywords) for word in words):
-                inferred_scope = key
-                break
+        inferred_scope = infer_search_scope(primary_keywords)
         if inferred_scope:
             scope = inferred_scope
         else:
             await ctx.send("⚠️ Unable to determine scope. Please provide `scope:<plugin/preset/drumkit/etc>` in your query.")
             return
 
+    step_started = perf_lap("searchkit.scope", step_started)
+
     # --- Step 3: Determine identity vs attachment search ---
     # CORE = main plugin, CONTENT = expansions/presets/etc
-    identity_keywords = ["preset", "bank", "expansion", "pack", "addon", "soundbank", "drumkit", "loop", "crack", "patch", "keygen"]
-    search_mode = "CONTENT" if any(k in primary_keywords for k in identity_keywords) or scope in ["preset", "drumkit", "loops", "midi", "expansion", "crack"] else "CORE"
-
-    # --- Step 4: Filter links by scope and search mode ---
-    filtered_links = []
-    for link in all_loaded_links:
-        raw_path = urlparse(link).path.lower()
-        clean_path = get_clean_url_path(link)
-
-        # 4a: Scope check
-        scope_match = False
-        if scope == "plugin" and any(x in raw_path for x in ["vst", "plugin", "au-aax"]):
-            scope_match = True
-        elif scope == "preset" and any(x in raw_path for x in ["preset", "bank"]):
-            scope_match = True
-        elif scope == "drumkit" and "drum-kit" in raw_path:
-            scope_match = True
-        elif scope == "loops" and "loops" in raw_path:
-            scope_match = True
-        elif scope == "midi" and "midi" in raw_path:
-            scope_match = True
-        elif scope == "installer" and any(x in raw_path for x in ["installer", ".exe", ".dmg", ".pkg"]):
-            scope_match = True
-        elif scope == "expansion" and "expansion" in raw_path:
-            scope_match = True
-        elif scope == "crack" and any(x in raw_path for x in ["crack", "patch", "keygen"]):
-            scope_match = True
-        elif scope == "tutorial" and "tutorial" in raw_path:
-            scope_match = True
-        elif scope == "tool" and "tool" in raw_path:
-            scope_match = True
-
-        if not scope_match:
-            continue
-
-        # 4b: Identity vs content check
-        if search_mode == "CORE":
-            if any(x in raw_path for x in identity_keywords):
-                continue  # skip content items
-        elif search_mode == "CONTENT":
-            if not any(x in raw_path for x in identity_keywords):
-                continue  # skip core items
-
-        # 4c: Primary keyword match (exact/loose)
-        if all(k in raw_path or k in clean_path for k in primary_keywords):
-            filtered_links.append(link)
-
-    if not filtered_links:
-        await ctx.send(f"⚠️ No kits found for: `{ ' '.join(primary_keywords) }` in scope `{scope}` ({search_mode})")
+    search_mode = determine_search_mode(primary_keywords, scope)
+    step_started = perf_lap("searchkit.mode", step_started)
+
+    # --- Steps 4-6: Filter by scope/mode, rank and select for display (runs in a search worker, off the event loop) ---
+    # Selection is top-k or a score-weighted sample, see SEARCH_SELECTION_POLICY. Up to RESULT_CURSOR_MAX_RESULTS
+    # are kept, so the result pages can be turned without searching again.
+    sample_seed = random.randrange(SEARCH_SAMPLE_VARIANTS) if SEARCH_SELECTION_POLICY == "weighted" else 0
+    index, ids_epoch = link_index, link_ids_epoch # What run_search searches (the link IDs are only valid for it)
+    try:
+        total_matches, selected_ids = await run_search(
+            rank_kit_matches, primary_keywords, scope, search_mode,
+            RESULT_CURSOR_MAX_RESULTS, SEARCH_SELECTION_POLICY, sample_seed,
+            requester=search_requester(ctx)
+        )
+    except SearchTimeout:
+        perf_count("searchkit.timeouts")
+        await ctx.send(f"⚠️ Search for `{search_query}` took too long. Add more keywords to narrow it down.")
+        return
+    except SearchBusy:
+        perf_count("searchkit.rejected")
+        await ctx.send("⏳ I'm busy with a lot of searches right now. Please try again in a few seconds.")
         return
+    # End to end: cache lookup, admission line (span "search.queue_wait") and the run itself (span "search.run")
+    step_started = perf_lap("searchkit.search", step_started)
+    perf_count("searchkit.matches", total_matches)
 
-    # --- Step 5: Rank by confidence (optional: exact name, short path, frequency) ---
-    def confidence_score(link):
-        raw_path = urlparse(link).path.lower()
-        clean_path = get_clean_url_path(link)
-        score = 0
-        # exact primary keyword match
-        for k in primary_keywords:
-            if k in raw_path:
-                score += 5
-            elif k in clean_path:
-                score += 3
-        # shorter paths = higher score
-        score += max(0, 10 - len(raw_path.split('/')))
-        # prefer core over content for CORE searches
-        if search_mode == "CORE" and not any(x in raw_path for x in identity_keywords):
-            score += 2
-        return score
-
-    ranked_links = sorted(filtered_links, key=confidence_score, reverse=True)
-
-    # --- Step 6: Random sampling for display ---
-    display_links = random.sample(ranked_links, min(len(ranked_links), MAX_SEARCH_RESULTS_DISPLAY))
+    if not total_matches:
+        await ctx.send(f"⚠️ No kits found for: `{ ' '.join(primary_keywords) }` in scope `{scope}` ({search_mode})")
+        return
 
     # ---- EMBED PAGINATION ----
-    EMBED_LINK_LIMIT = 10  # Safe number per embed
-    chunks = [display_links[i:i + EMBED_LINK_LIMIT] for i in range(0, len(display_links), EMBED_LINK_LIMIT)]
-
-    for idx, chunk in enumerate(chunks, start=1):
-        embed = discord.Embed(
-            title="🎧 Kit Search Results",
-            description=(
-                f"**Query:** `{ ' '.join(primary_keywords) }`\n"
-                f"**Scope:** `{scope}`\n"
-                f"**Mode:** `{search_mode}`\n"
-                f"**Total Matches:** `{len(ranked_links)}`\n"
-                f"**Showing:** `{len(display_links)}`"
-            ),
-            color=discord.Color.dark_purple()
-        )
-
-        for i, link in enumerate(chunk, start=1 + (idx - 1) * EMBED_LINK_LIMIT):
-            embed.add_field(
-                name=f"Result #{i}",
-                value=f"[Click to access kit]({link})",
-                inline=False
-            )
-
-        embed.set_footer(
-            text="Use more keywords to narrow results • Results are randomly sampled"
-        )
-
-        await ctx.send(embed=embed)
-
-    if len(ranked_links) > MAX_SEARCH_RESULTS_DISPLAY:
-        await ctx.send(
-            f"➕ `{len(ranked_links) - MAX_SEARCH_RESULTS_DISPLAY}` more matches found.\n"
-            f"Refine your search or use `!sendlink` to pull a random one."
-        )
+    # The selected links are kept in a result cursor; the first page is sent (in one message, through this channel's
+    # send queue) with ◀️ / ▶️ / 🔀 buttons when there is more than one page.
+    cursor = result_cursors.open(ids_epoch, selected_ids, primary_keywords, scope, search_mode, total_matches)
+    embeds = await load_result_page(index, cursor)
+    view = None
+    if cursor.has_next():
+        view = ResultPagesView(cursor)
+    else:
+        result_cursors.close(cursor.cursor_id) # Everything fits on one page: nothing to keep
+    notice = result_page_notice(cursor)
+    if deliver is None:
+        messages = await outbound.send_embeds(ctx.channel, embeds, notice, view)
+    else:
+        messages = await deliver(embeds, notice, view)
+    if view is not None and messages:
+        view.message = messages[-1]
+    step_started = perf_lap("searchkit.deliver", step_started)
+    perf_lap("searchkit.total", command_started)
 
     print(
         f"[SEARCHKIT] {ctx.author} searched '{search_query}' "
-        f"({len(ranked_links)} matches) in #{ctx.channel.name}"
+        f"({total_matches} matches) in #{getattr(ctx.channel, 'name', 'DM')}"
     )
 
+@bot.command(
+    name="searchkit",
+    help=f"Searches for kits by multiple keywords (e.g., 'omnisphere win installer') and displays up to {MAX_SEARCH_RESULTS_DISPLAY} random matches."
+)
+@commands.has_permissions(send_messages=True)
+async def search_kit_command(ctx, *, search_query: str):
+    """
+    Searches the loaded links for multiple keywords and displays results
+    using advanced search logic (scope, identity vs content, name precision, platform, ranking).
+    """
+    await run_kit_search(ctx, search_query)
 
-@bot.command(name="sendlink", help="Searches for a kit by keyword(s) and sends a random match to a named channel.")
-@commands.has_permissions(send_messages=True) # Basic permission to send messages in the current channel for response
-async def send_link_by_search_and_channel(ctx, search_query: str, target_discord_channel_name: str):
+
+async def run_send_link(ctx, search_query: str, target_discord_channel_name: str, confirm=None, count: int = 1):
     """
     Searches the loaded links for specific keywords (e.g., 'bloodhound win')
-    and sends a random matching link to the specified Discord channel by name.
+    and sends a random matching link (or count different ones) to the specified Discord channel by name.
     Example: #sendlink bloodhound zenology-banks
+    Shared by `#sendlink` and `/sendlink` (ctx is a command Context or a SlashContext);
+    confirm is passed on to dispatch_random_match.
     """
     search_terms = search_query.split() # Split the query into individual terms
+    count = max(1, min(count, SENDLINK_MAX_BULK))
     await ctx.send(f"Searching for kits matching '{' '.join(search_terms)}' to send to channel '{target_discord_channel_name}'...")
 
     final_target_channel_obj = resolved_target_channels.get(target_discord_channel_name.lower())
@@ -446,25 +3660,53 @@ async def send_link_by_search_and_channel(ctx, search_query: str, target_discord
         await ctx.send(f"ERROR: I lack permissions to send messages in the specified channel {final_target_channel_obj.mention}.")
         return
 
-    # Perform the search
-    matching_links = search_links_by_keyword(search_terms)
+    # Perform the search (in a search worker, off the event loop)
+    perf_count("sendlink.queries")
+    try:
+        with perf_span("sendlink.search"):
+            matching_links = await run_search(search_links_by_keyword, search_terms, requester=search_requester(ctx))
+    except SearchTimeout:
+        perf_count("sendlink.timeouts")
+        await ctx.send(f"Search for '{' '.join(search_terms)}' took too long. Try more specific keywords!")
+        return
+    except SearchBusy:
+        perf_count("sendlink.rejected")
+        await ctx.send("I'm busy with a lot of searches right now. Please try again in a few seconds.")
+        return
 
     if not matching_links:
         await ctx.send(f"No kits found matching '{' '.join(search_terms)}' in the loaded list. Try different keywords!")
         return
 
-    # Dispatch a random match from the found links
-    await dispatch_random_match(ctx, search_query, final_target_channel_obj, matching_links) # Use original search_query for message
+    # Dispatch the next match(es) of this query's rotation for the channel
+    await dispatch_random_match(ctx, search_query, final_target_channel_obj, matching_links, confirm, count) # Use original search_query for message
+
+@bot.command(name="sendlink", help="Searches for a kit by keyword(s) and sends a random match (or several: add a count) to a named channel.")
+@commands.has_permissions(send_messages=True) # Basic permission to send messages in the current channel for response
+async def send_link_by_search_and_channel(ctx, search_query: str, target_discord_channel_name: str, count: int = 1):
+    """
+    Searches the loaded links for specific keywords (e.g., 'bloodhound win')
+    and sends a random matching link to the specified Discord channel by name.
+    Matches are not repeated in a channel until all of them were sent.
+    Example: #sendlink bloodhound zenology-banks
+    Example: #sendlink "serum win" zenology-banks 5 (five different links at once)
+    """
+    await run_send_link(ctx, search_query, target_discord_channel_name, count=count)
 
 
-@bot.command(name="reloadlinks", help="Reloads all links from the configured LINKS_FILES.")
+@bot.command(name="reloadlinks", help="Loads links appended to the configured LINKS_FILES. Use '#reloadlinks full' to reload everything.")
 @commands.has_permissions(administrator=True) # Only administrators can reload critical data
-async def reload_links_command(ctx):
-    """Reloads all links from the configured LINKS_FILES."""
-    global all_loaded_links
-    all_loaded_links = load_all_links_from_files(LINKS_FILES) # Load from MULTIPLE files
-    if all_loaded_links:
-        await ctx.send(f"Successfully reloaded {len(all_loaded_links)} links from {len(LINKS_FILES)} files.")
+async def reload_links_command(ctx, mode: str = ""):
+    """
+    Loads links appended to the configured LINKS_FILES since the last load.
+    `full` forces every file to be re-read from scratch.
+    """
+    added, full_reload = await refresh_link_index(force_full=mode.lower() == "full")
+    if link_index is not None and len(link_index):
+        if full_reload:
+            await ctx.send(f"Successfully reloaded {len(link_index)} links from {len(LINKS_FILES)} files.")
+        else:
+            await ctx.send(f"Added {added} new links. Now searching {len(link_index)} links from {len(LINKS_FILES)} files.")
     else:
         await ctx.send(f"WARNING: No links loaded after reload from the configured LINKS_FILES.")
 
@@ -505,12 +3747,133 @@ async def show_configured_channels(ctx):
 @bot.command(name="status", help="Displays the bot's current operational status.")
 async def bot_status(ctx):
     """Displays current status and number of loaded links."""
+    index = link_index
+    variant_count = 0
+    if index is not None: # Counted in a thread: a SQLite index counts them in the database
+        variant_count = await asyncio.get_running_loop().run_in_executor(None, index.records.variant_count, len(index))
+    grouped = f" (+{variant_count} grouped near-duplicates)" if variant_count else ""
     status_msg = f"Intelligent Retriever Bot is online!\n" \
-                 f"Loaded links: {len(all_loaded_links)}\n" \
+                 f"Loaded links: {len(index) if index is not None else 0}{grouped}\n" \
                  f"Resolved target channels: {len(resolved_target_channels)}\n" \
+                 f"Search cache: {search_result_cache.stats_line()}\n" \
+                 f"Search admission: {search_admission.stats_line()}\n" \
+                 f"Result pages: {result_cursors.stats_line()}\n" \
+                 f"Sendlink rotations: {send_rotations.stats_line()}\n" \
+                 f"Outbound: {outbound.stats_line()}\n" \
                  f"Prefix: `{PREFIX}`"
     await ctx.send(status_msg)
 
+@bot.command(name="perf", help="Shows search latency histograms and counters. Use '#perf reset' to clear them.")
+@commands.has_permissions(administrator=True)
+async def perf_command(ctx, action: str = ""):
+    """Displays per-step latency percentiles and counters recorded while PERF_METRICS_ENABLED is on."""
+    if not PERF_METRICS_ENABLED:
+        await ctx.send("Performance metrics are disabled. Set `PERF_METRICS_ENABLED = True` in the CONFIGURATION SECTION.")
+        return
+    if action.lower() == "reset":
+        perf_metrics.reset()
+        await ctx.send("Performance metrics cleared.")
+        return
+    perf_metrics.gauge("corpus_links", len(link_index) if link_index is not None else 0)
+    report = "\n".join(perf_metrics.report_lines())
+    if len(report) > 1900: # Stay inside Discord's 2000 character message limit
+        report = report[:1900] + "\n..."
+    await ctx.send(f"**Performance metrics:**\n```\n{report}\n```")
+
+# --- Slash Commands ---
+
+class SlashContext:
+    """
+    Lets the shared command pipelines (run_kit_search, run_send_link) answer a slash command:
+    it has the `send`, `channel`, `guild` and `author` a command Context has, and sends as follow-ups
+    to the (deferred) interaction, which also gets around the channel's send queue.
+    """
+
+    def __init__(self, interaction: discord.Interaction):
+        self.interaction = interaction
+        self.channel = interaction.channel
+        self.guild = interaction.guild
+        self.author = interaction.user
+
+    async def send(self, content: str = None, embeds: list = None, embed: discord.Embed = None, view: discord.ui.View = None):
+        if embed is not None:
+            embeds = [embed]
+        return await self.interaction.followup.send(
+            content=content, embeds=embeds or discord.utils.MISSING, view=view if view is not None else discord.utils.MISSING
+        )
+
+    async def send_embeds(self, embeds: list, notice: str = None, view: discord.ui.View = None):
+        """deliver() for run_kit_search: the result embeds, packed like outbound.send_embeds does (view on the last message)."""
+        messages = pack_embed_messages(embeds, notice)
+        return [
+            await self.send(content, batch, view=view if position == len(messages) - 1 else None)
+            for position, (content, batch) in enumerate(messages)
+        ]
+
+def autocomplete_choices(values: list):
+    return [app_commands.Choice(name=value, value=value) for value in values[:AUTOCOMPLETE_MAX_CHOICES]]
+
+async def search_query_autocomplete(interaction: discord.Interaction, current: str):
+    with perf_span("autocomplete.query"):
+        # In a thread: with the SQLite backend, the vocabulary is looked up in the database
+        queries = await asyncio.get_running_loop().run_in_executor(None, suggest_search_queries, current)
+        return autocomplete_choices(queries)
+
+async def scope_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    return autocomplete_choices([scope for scope in SCOPE_KEYWORDS if scope.startswith(current)])
+
+async def target_channel_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    return autocomplete_choices(sorted(name for name in resolved_target_channels if current in name))
+
+@bot.tree.command(name="searchkit", description=f"Search for kits by keywords and show up to {MAX_SEARCH_RESULTS_DISPLAY} matches.")
+@app_commands.describe(query="Keywords, e.g. 'omnisphere win installer' (suggestions come from the vault)", scope="Kind of kit, e.g. plugin or preset")
+@app_commands.autocomplete(query=search_query_autocomplete, scope=scope_autocomplete)
+@app_commands.guild_only()
+@app_commands.checks.has_permissions(send_messages=True) # Same check as `#searchkit`
+async def searchkit_slash_command(interaction: discord.Interaction, query: str, scope: str = None):
+    """`/searchkit`: same search as `#searchkit`, with autocomplete."""
+    await interaction.response.defer(thinking=True)
+    ctx = SlashContext(interaction)
+    await run_kit_search(ctx, f"{query} scope:{scope}" if scope else query, deliver=ctx.send_embeds)
+
+@bot.tree.command(name="sendlink", description="Search for a kit by keywords and send a random match (or several) to a channel.")
+@app_commands.describe(
+    query="Keywords, e.g. 'bloodhound win'", channel="Target channel (from TARGET_CHANNEL_NAMES)",
+    count="How many different links to send at once"
+)
+@app_commands.autocomplete(query=search_query_autocomplete, channel=target_channel_autocomplete)
+@app_commands.guild_only() # Like the prefix commands, which only run in the guilds' channels
+@app_commands.checks.has_permissions(send_messages=True) # Same check as `#sendlink`
+async def sendlink_slash_command(interaction: discord.Interaction, query: str, channel: str,
+                                 count: app_commands.Range[int, 1, SENDLINK_MAX_BULK] = 1):
+    """`/sendlink`: same as `#sendlink`, with autocomplete."""
+    await interaction.response.defer(thinking=True)
+    ctx = SlashContext(interaction)
+    await run_send_link(ctx, query, channel, confirm=ctx.send, count=count)
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    """
+    Handles errors raised by slash commands, like on_command_error does for prefix commands. The commands
+    defer first, so the message goes out as a follow-up; without one the user is left on "thinking...".
+    """
+    if isinstance(error, app_commands.CommandInvokeError):
+        error = error.original
+    if isinstance(error, app_commands.MissingPermissions):
+        message = f"You lack the necessary permissions to perform '{interaction.command.name}'."
+    else:
+        print(f"An unexpected error occurred in /{interaction.command.name if interaction.command else '?'}: {error}")
+        message = f"An unknown force briefly resisted my command: `{error}`. I shall overcome!"
+    try:
+        if interaction.response.is_done():
+            await interaction.followup.send(message)
+        else:
+            await interaction.response.send_message(message)
+    except discord.HTTPException as e: # The interaction may have expired meanwhile
+        print(f"ERROR: Could not report the error to the user: {e}")
+
 # --- Bot Execution ---
 
 def run_bot():
@@ -531,10 +3894,14 @@ def run_bot():
              print("WARNING: Using the hardcoded BOT_TOKEN you previously provided. For production, strongly consider using an environment variable for security.")
         
         bot.run(final_bot_token)
+        shutdown_search_pool()
     except discord.LoginFailure:
         print("ERROR: Invalid BOT_TOKEN provided. Ensure your BOT_TOKEN is correct and valid in the CONFIGURATION SECTION.")
     except Exception as e:
         print(f"ERROR: Bot encountered an unexpected error during Discord connection: {e}")
 
 if __name__ == "__main__":
-    run_bot()
+    if "--compile" in sys.argv[1:]:
+        compile_links_snapshot()
+    else:
+        run_bot()
@@ -0,0 +1,355 @@
+"""
+Offline benchmark for the 420VaultBot search pipeline (no Discord connection needed).
+
+Measures, for one link corpus:
+  - load time (streaming + deduplicating the files into the LinkIndex builder)
+  - get_clean_url_path throughput
+  - per-query latency (p50/p99) and throughput for a fixed query mix that covers
+    single terms, multiple terms, scope-only searches and platform terms (win/mac/installer),
+    through both the `#searchkit` pipeline and the `#sendlink` keyword search
+  - peak resident memory (RSS) of the benchmark process
+
+Results can be saved as a named baseline and later runs compared against it.
+
+Usage (from the repository folder):
+  python3 bench/bench_search.py run                                   # the real lists_part_*.txt files
+  python3 bench/bench_search.py run --save-baseline real_lists        # ...and save the numbers
+  python3 bench/bench_search.py run --compare real_lists              # ...or compare against them
+  python3 bench/bench_search.py generate --links 1000000 --out bench/data/vault_1m.txt
+  python3 bench/bench_search.py run --files bench/data/vault_1m.txt --save-baseline vault_1m
+  python3 bench/bench_search.py run --files bench/data/vault_1m.txt --shards 4     # also time sharded search
+  python3 bench/bench_search.py run --sqlite                          # also time the SQLite search backend
+
+With --shards N the corpus is compiled to a temporary snapshot and the query mix is also run through the
+sharded search engine (N worker processes); every sharded result must be identical to the single-process one.
+With --sqlite the corpus is also written to a temporary SQLite database and searched through that backend,
+with the same requirement.
+
+Peak RSS is per process, so run one corpus per invocation to compare memory use.
+"""
+import argparse
+import gc
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BOT_FILE = os.path.join(REPO_DIR, "420VaultBot.py")
+BASELINES_DIR = os.path.join(BENCH_DIR, "baselines")
+DEFAULT_FILES = [os.path.join(REPO_DIR, "lists_part_2.txt"), os.path.join(REPO_DIR, "lists_part_3.txt")]
+
+# QUERY MIX: (kind, query). "searchkit" queries go through parse -> scope inference -> mode -> rank/select,
+# exactly like the command; "sendlink" queries go through search_links_by_keyword.
+QUERY_MIX = [
+    # Single term
+    ("searchkit", "serum preset"),
+    ("searchkit", "omnisphere vst"),
+    ("searchkit", "kontakt scope:plugin"),
+    ("sendlink", "serum"),
+    ("sendlink", "omnisphere"),
+    # Multiple terms
+    ("searchkit", "arturia pigments vst win"),
+    ("searchkit", "trap loops"),
+    ("sendlink", "fabfilter pro q"),
+    # Scope only (broad queries)
+    ("searchkit", "scope:plugin"),
+    ("searchkit", "scope:preset"),
+    ("searchkit", "scope:installer"),
+    # Platform terms
+    ("searchkit", "scope:plugin win"),
+    ("searchkit", "scope:plugin mac"),
+    ("sendlink", "win"),
+    ("sendlink", "mac installer"),
+    ("sendlink", "serum win"),
+]
+
+def load_bot_module():
+    """Imports 420VaultBot.py as a module (its file name is not a valid module name)."""
+    spec = importlib.util.spec_from_file_location("vaultbot", BOT_FILE)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["vaultbot"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(samples: list, fraction: float):
+    """Nearest-rank percentile of samples (fraction in 0..1)."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+# --- Synthetic vault generator ---
+
+def generate_vault(template_files: list, links: int, seed: int, out_path: str):
+    """
+    Writes `links` unique synthetic URLs to out_path, with the same host/path shape as the real lists.
+    Every synthetic link starts from a random real link (keeping its host, separators and extension)
+    and has about half of its words and all of its numbers swapped for random ones, so token
+    frequencies and path lengths look like the real vault but the links are new.
+    """
+    rng = random.Random(seed)
+    templates = []
+    words = []
+    for filename in template_files:
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and not line.startswith('---'):
+                    templates.append(line)
+                    words.extend(w for w in re.findall(r'[a-z]+', line.lower().split('/', 3)[-1]) if len(w) > 1)
+    if not templates:
+        raise SystemExit("No template links found to generate a synthetic vault from.")
+
+    split_host = re.compile(r'^(https?://[^/]+)(.*)$')
+    path_parts = re.compile(r'[A-Za-z]+|[0-9]+|[^A-Za-z0-9]+')
+    seen = set()
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    started = time.perf_counter()
+    with open(out_path, 'w', encoding='utf-8') as out:
+        while len(seen) < links:
+            match = split_host.match(rng.choice(templates))
+            if not match:
+                continue
+            host, path = match.groups()
+            parts = []
+            for part in path_parts.findall(path):
+                if part.isdigit():
+                    parts.append(str(rng.randrange(10 ** len(part))))
+                elif part.isalpha() and len(part) > 1 and part.lower() not in ("html", "php", "exe", "zip", "rar", "dmg", "pkg") and rng.random() < 0.5:
+                    parts.append(rng.choice(words))
+                else:
+                    parts.append(part)
+            url = host + "".join(parts)
+            if url not in seen:
+                seen.add(url)
+                out.write(url + "\n")
+    print(f"Generated {links} synthetic links in {time.perf_counter() - started:.1f}s -> {out_path}")
+
+# --- Benchmark ---
+
+def run_query(bot_module, index, kind: str, query: str, engine=None):
+    """
+    Runs one query through the same pure functions the bot commands use (split over engine's shards, if given).
+    Returns (match count, full result).
+    """
+    def search(search_function, *args):
+        if engine is not None:
+            return engine.search(index, search_function, *args)
+        return search_function(index, *args)
+
+    if kind == "sendlink":
+        links = search(bot_module.search_links_by_keyword, query.split())
+        return len(links), links
+    keywords, params = bot_module.parse_search_query(query)
+    scope = params.get("scope") or bot_module.infer_search_scope(keywords)
+    if scope is None:
+        return 0, None
+    mode = bot_module.determine_search_mode(keywords, scope)
+    result = search(
+        bot_module.rank_kit_matches, keywords, scope, mode, bot_module.RESULT_CURSOR_MAX_RESULTS,
+        bot_module.SEARCH_SELECTION_POLICY, 0
+    )
+    return result[0], result
+
+def run_sharded(bot_module, index, shards: int, repeat: int, expected: dict):
+    """
+    Compiles index to a temporary snapshot and runs the query mix through a ShardedSearchEngine.
+    Exits with an error if any sharded result differs from the single-process one. Returns metrics.
+    """
+    temp_dir = tempfile.mkdtemp(prefix="vault_bench_")
+    engine = bot_module.ShardedSearchEngine(shards)
+    try:
+        path = os.path.join(temp_dir, "links_index.snapshot")
+        bot_module.write_links_snapshot(index, {}, path)
+        mapped_index, _ = bot_module.open_links_snapshot(path)
+        for kind, query in QUERY_MIX: # Warm-up: starts the workers and maps the snapshot in each of them
+            run_query(bot_module, mapped_index, kind, query, engine)
+        all_latencies = []
+        started_queries = time.perf_counter()
+        for _ in range(repeat):
+            for kind, query in QUERY_MIX:
+                started = time.perf_counter()
+                _, result = run_query(bot_module, mapped_index, kind, query, engine)
+                all_latencies.append((time.perf_counter() - started) * 1000)
+                if result != expected[f"{kind}: {query}"]:
+                    raise SystemExit(f"Sharded result differs from the single-process result for {kind}: {query}")
+        query_seconds = time.perf_counter() - started_queries
+    finally:
+        engine.shutdown()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return {
+        "sharded_query_p50_ms": round(statistics.median(all_latencies), 3),
+        "sharded_query_p99_ms": round(percentile(all_latencies, 0.99), 3),
+        "sharded_queries_per_s": round(len(all_latencies) / query_seconds, 1),
+    }
+
+def run_sqlite(bot_module, index, repeat: int, expected: dict):
+    """
+    Builds a temporary SQLite database from index and runs the query mix through the SQLite search backend.
+    Exits with an error if any SQLite result differs from the in-memory one. Returns metrics.
+    """
+    temp_dir = tempfile.mkdtemp(prefix="vault_bench_")
+    try:
+        started = time.perf_counter()
+        database = bot_module.SqliteLinkIndex.build(
+            os.path.join(temp_dir, "links_index.sqlite3"),
+            itertools.chain(index.records, index.records.iter_variants())
+        )
+        build_seconds = time.perf_counter() - started
+        database_mb = os.path.getsize(database.path) / (1024 * 1024)
+        all_latencies = []
+        started_queries = time.perf_counter()
+        for _ in range(repeat):
+            for kind, query in QUERY_MIX:
+                started = time.perf_counter()
+                _, result = run_query(bot_module, database, kind, query)
+                all_latencies.append((time.perf_counter() - started) * 1000)
+                if result != expected[f"{kind}: {query}"]:
+                    raise SystemExit(f"SQLite result differs from the in-memory result for {kind}: {query}")
+        query_seconds = time.perf_counter() - started_queries
+        del database # Closes the pooled connections before the file is removed
+        gc.collect()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return {
+        "sqlite_build_s": round(build_seconds, 3),
+        "sqlite_database_mb": round(database_mb, 1),
+        "sqlite_query_p50_ms": round(statistics.median(all_latencies), 3),
+        "sqlite_query_p99_ms": round(percentile(all_latencies, 0.99), 3),
+        "sqlite_queries_per_s": round(len(all_latencies) / query_seconds, 1),
+    }
+
+def run_benchmark(files: list, repeat: int, shards: int = 0, sqlite: bool = False):
+    """
+    Loads the corpus in files and runs the query mix `repeat` times (also sharded, if shards > 1,
+    and through the SQLite backend, if sqlite).
+    Returns (dict of metrics, {query: match count}).
+    """
+    bot_module = load_bot_module()
+    gc.collect()
+
+    started = time.perf_counter()
+    # Files are streamed straight into the index builder, so reading and indexing are timed together
+    index = bot_module.LinkIndex(bot_module.LinkReloader(files).load_full())
+    load_seconds = time.perf_counter() - started
+    rss_after_load = peak_rss_mb()
+
+    sample = [index.records[i].url for i in range(min(5000, len(index)))]
+    started = time.perf_counter()
+    for url in sample:
+        bot_module.get_clean_url_path(url)
+    clean_us = (time.perf_counter() - started) / max(1, len(sample)) * 1e6
+
+    latencies = {kind: [] for kind, _ in QUERY_MIX}
+    matches = {}
+    results = {}
+    all_latencies = []
+    started_queries = time.perf_counter()
+    for _ in range(repeat):
+        for kind, query in QUERY_MIX:
+            started = time.perf_counter()
+            matches[f"{kind}: {query}"], results[f"{kind}: {query}"] = run_query(bot_module, index, kind, query)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            latencies[kind].append(elapsed_ms)
+            all_latencies.append(elapsed_ms)
+    query_seconds = time.perf_counter() - started_queries
+
+    metrics = {
+        "links": len(index),
+        "load_total_s": round(load_seconds, 3),
+        "clean_url_path_us": round(clean_us, 2),
+        "query_p50_ms": round(statistics.median(all_latencies), 3),
+        "query_p99_ms": round(percentile(all_latencies, 0.99), 3),
+        "queries_per_s": round(len(all_latencies) / query_seconds, 1),
+        "peak_rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    for kind, samples in latencies.items():
+        metrics[f"{kind}_p50_ms"] = round(statistics.median(samples), 3)
+        metrics[f"{kind}_p99_ms"] = round(percentile(samples, 0.99), 3)
+    if shards > 1:
+        metrics["shards"] = shards
+        metrics.update(run_sharded(bot_module, index, shards, repeat, results))
+    if sqlite:
+        metrics.update(run_sqlite(bot_module, index, repeat, results))
+    return metrics, matches
+
+# Metrics where a higher number is better (everything else: lower is better)
+HIGHER_IS_BETTER = {"queries_per_s", "sharded_queries_per_s", "sqlite_queries_per_s"}
+
+def print_metrics(metrics: dict, baseline: dict = None):
+    """Prints metrics, with the change against baseline when one is given."""
+    for name, value in metrics.items():
+        line = f"  {name:<26} {value:>12}"
+        if baseline and isinstance(baseline.get(name), (int, float)) and name not in ("links", "shards") and baseline[name]:
+            change = (value - baseline[name]) / baseline[name] * 100
+            better = change > 0 if name in HIGHER_IS_BETTER else change < 0
+            line += f"   baseline {baseline[name]:>12}  {change:+7.1f}% {'better' if better else 'worse' if change else ''}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the 420VaultBot search pipeline.")
+    commands_parser = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands_parser.add_parser("run", help="Benchmark loading and searching a link corpus.")
+    run_parser.add_argument("--files", nargs="+", default=DEFAULT_FILES, help="Link files to load (default: the real lists).")
+    run_parser.add_argument("--repeat", type=int, default=20, help="How many times to run the query mix.")
+    run_parser.add_argument("--save-baseline", metavar="NAME", help="Save the results as bench/baselines/NAME.json.")
+    run_parser.add_argument("--compare", metavar="NAME", help="Compare against bench/baselines/NAME.json.")
+    run_parser.add_argument("--show-matches", action="store_true", help="Print the match count of every query.")
+    run_parser.add_argument("--shards", type=int, default=0, help="Also run the query mix split over this many shard workers.")
+    run_parser.add_argument("--sqlite", action="store_true", help="Also run the query mix through the SQLite search backend.")
+
+    generate_parser = commands_parser.add_parser("generate", help="Write a synthetic vault shaped like the real lists.")
+    generate_parser.add_argument("--links", type=int, default=100000, help="Number of unique links to generate.")
+    generate_parser.add_argument("--seed", type=int, default=420, help="Random seed (same seed = same vault).")
+    generate_parser.add_argument("--templates", nargs="+", default=DEFAULT_FILES, help="Real link files to copy the shape from.")
+    generate_parser.add_argument("--out", required=True, help="Output file.")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate_vault(args.templates, args.links, args.seed, args.out)
+        return
+
+    metrics, matches = run_benchmark(args.files, args.repeat, args.shards, args.sqlite)
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f"{args.compare}.json"), 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["metrics"]
+    print(f"Benchmark of {metrics['links']} links from {len(args.files)} file(s), query mix x{args.repeat}:")
+    print_metrics(metrics, baseline)
+    if args.show_matches:
+        for query, count in matches.items():
+            print(f"  {count:>8}  {query}")
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{args.save_baseline}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "files": [os.path.relpath(name, REPO_DIR) for name in args.files],
+                "repeat": args.repeat,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "metrics": metrics,
+                "matches": matches
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline '{path}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "420VaultBot.py")
+
+@pytest.fixture(scope="session")
+def vaultbot():
+    """The bot module (its file name is not importable as is). Loading it only defines things, it doesn't connect."""
+    module = sys.modules.get("vaultbot")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("vaultbot", BOT_FILE)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["vaultbot"] = module
+        spec.loader.exec_module(module)
+    return module
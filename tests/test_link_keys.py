@@ -0,0 +1,31 @@
+import pytest
+
+@pytest.mark.parametrize("first, second", [
+    ("http://WWW.Site.com/kit/", "https://site.com/kit"),
+    ("https://site.com/kit?utm_source=x&fbclid=y", "https://site.com/kit"),
+    ("https://site.com:443/kit#download", "https://site.com/kit"),
+    ("https://site.com/kit?b=2&a=1", "https://site.com/kit?a=1&b=2"),
+])
+def test_same_page_written_differently_gets_one_key(vaultbot, first, second):
+    assert vaultbot.canonical_link_key(first) == vaultbot.canonical_link_key(second)
+
+@pytest.mark.parametrize("first, second", [
+    ("https://host/a;x", "https://host/a;y"),
+    ("https://site.com:8080/kit", "https://site.com/kit"),
+    ("https://site.com/kit?id=1", "https://site.com/kit?id=2"),
+])
+def test_different_pages_keep_different_keys(vaultbot, first, second):
+    assert vaultbot.canonical_link_key(first) != vaultbot.canonical_link_key(second)
+
+@pytest.mark.parametrize("repost, original", [
+    ("site.com/serum-kit-copy", "site.com/serum-kit"),
+    ("site.com/serum-kit-copy-2", "site.com/serum-kit"),
+    ("site.com/serum-kit-2024-03-01", "site.com/serum-kit"),
+    ("site.com/serum-kit/2024-03-01-1234", "site.com/serum-kit"),
+])
+def test_reposts_share_the_original_near_duplicate_key(vaultbot, repost, original):
+    assert vaultbot.near_duplicate_key(repost) == vaultbot.near_duplicate_key(original)
+
+@pytest.mark.parametrize("link_key", ["site.com/pack-vol-2", "site.com/xfer-serum-2", "site.com/kit-v1-2", "site.com/kit-1-0-2"])
+def test_numbered_slugs_are_not_folded(vaultbot, link_key):
+    assert vaultbot.near_duplicate_key(link_key) == link_key
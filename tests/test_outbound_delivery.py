@@ -0,0 +1,127 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+class FakeChannel:
+    """Stands in for a discord Messageable: records what is sent, and raises the queued errors first."""
+
+    def __init__(self, errors=()):
+        self.id = 1
+        self.sent = [] # (time sent, content, embeds, view)
+        self.errors = list(errors)
+
+    async def send(self, content=None, embeds=None, view=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((time.monotonic(), content, embeds, view))
+        return SimpleNamespace(content=content, embeds=embeds)
+
+def too_many_requests():
+    return discord.HTTPException(SimpleNamespace(status=429, reason="Too Many Requests"), "rate limited")
+
+def embed_of(chars: int):
+    return discord.Embed(description="x" * chars)
+
+def test_text_messages_waiting_together_are_coalesced(vaultbot):
+    async def scenario():
+        channel = FakeChannel()
+        queue = vaultbot.ChannelSendQueue(channel, rate=5, per=5, max_retries=0)
+        futures = [queue.send("one"), queue.send("two"), queue.send(embeds=[embed_of(10)]), queue.send("three")]
+        messages = await asyncio.gather(*futures)
+        assert [content for _, content, _, _ in channel.sent] == ["one\ntwo", None, "three"]
+        assert messages[0] is messages[1] # Both get the message they were sent in
+        assert queue.sent == 3 and queue.coalesced == 1
+    asyncio.run(scenario())
+
+def test_coalescing_stops_at_the_message_size_limit(vaultbot):
+    async def scenario():
+        channel = FakeChannel()
+        queue = vaultbot.ChannelSendQueue(channel, rate=5, per=5, max_retries=0)
+        long_text = "x" * (vaultbot.DISCORD_MAX_MESSAGE_CHARS - 10)
+        await asyncio.gather(queue.send(long_text), queue.send("y" * 20))
+        assert [content for _, content, _, _ in channel.sent] == [long_text, "y" * 20]
+    asyncio.run(scenario())
+
+def test_sends_at_most_rate_messages_per_window(vaultbot):
+    async def scenario():
+        channel = FakeChannel()
+        queue = vaultbot.ChannelSendQueue(channel, rate=2, per=0.2, max_retries=0)
+        await asyncio.gather(*(queue.send(embeds=[embed_of(10)]) for _ in range(4)))
+        times = [sent_at for sent_at, _, _, _ in channel.sent]
+        assert len(times) == 4
+        assert times[2] - times[0] >= 0.19 and times[3] - times[1] >= 0.19
+        assert queue.throttled >= 1
+    asyncio.run(scenario())
+
+def test_rate_limited_sends_are_retried_with_backoff(vaultbot, monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        delays.append(delay)
+        await real_sleep(0)
+
+    async def scenario():
+        channel = FakeChannel([discord.RateLimited(0.5), too_many_requests(), too_many_requests()])
+        queue = vaultbot.ChannelSendQueue(channel, rate=100, per=1, max_retries=3)
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        message = await queue.send(embeds=[embed_of(10)])
+        assert message.embeds and len(channel.sent) == 1
+        assert delays == [0.5, 2.0, 4.0] # Discord's retry_after first, then the doubling back-off
+        assert queue.retries == 3
+    asyncio.run(scenario())
+
+def test_gives_up_after_max_retries_and_keeps_sending(vaultbot, monkeypatch):
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        await real_sleep(0)
+
+    async def scenario():
+        channel = FakeChannel([too_many_requests(), too_many_requests()])
+        queue = vaultbot.ChannelSendQueue(channel, rate=100, per=1, max_retries=1)
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        failed, delivered = queue.send(embeds=[embed_of(10)]), queue.send(embeds=[embed_of(20)])
+        with pytest.raises(discord.HTTPException):
+            await failed
+        assert (await delivered).embeds[0].description == "x" * 20
+    asyncio.run(scenario())
+
+def test_other_http_errors_are_not_retried(vaultbot):
+    async def scenario():
+        forbidden = discord.HTTPException(SimpleNamespace(status=403, reason="Forbidden"), "missing access")
+        channel = FakeChannel([forbidden])
+        queue = vaultbot.ChannelSendQueue(channel, rate=5, per=5, max_retries=3)
+        with pytest.raises(discord.HTTPException):
+            await queue.send("hello")
+        assert queue.retries == 0
+    asyncio.run(scenario())
+
+def test_pack_embed_messages_splits_at_ten_embeds(vaultbot):
+    messages = vaultbot.pack_embed_messages([embed_of(10) for _ in range(23)], notice="more")
+    assert [len(batch) for _, batch in messages] == [10, 10, 3]
+    assert [content for content, _ in messages] == [None, None, "more"]
+
+def test_pack_embed_messages_splits_at_the_character_limit(vaultbot):
+    messages = vaultbot.pack_embed_messages([embed_of(2500) for _ in range(5)])
+    assert [len(batch) for _, batch in messages] == [2, 2, 1]
+    for _, batch in messages:
+        assert sum(len(embed) for embed in batch) <= vaultbot.DISCORD_MAX_EMBED_CHARS_PER_MESSAGE
+
+def test_pack_embed_messages_sends_a_lone_notice(vaultbot):
+    assert vaultbot.pack_embed_messages([], notice="nothing new") == [("nothing new", [])]
+    assert vaultbot.pack_embed_messages([]) == []
+
+def test_send_embeds_puts_the_view_on_the_last_message(vaultbot):
+    async def scenario():
+        channel = FakeChannel()
+        delivery = vaultbot.OutboundDelivery(rate=5, per=5, max_retries=0)
+        view = object()
+        messages = await delivery.send_embeds(channel, [embed_of(10) for _ in range(12)], notice="more", view=view)
+        assert len(messages) == 2
+        assert [sent_view for _, _, _, sent_view in channel.sent] == [None, view]
+        assert channel.sent[-1][1] == "more"
+    asyncio.run(scenario())
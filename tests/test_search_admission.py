@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+USER_A, USER_B, USER_C = (1, 10), (2, 10), (3, 10)
+
+def test_runs_up_to_the_guild_limit_then_queues(vaultbot):
+    async def scenario():
+        admission = vaultbot.SearchAdmission(per_user=2, per_guild=1, queue_size=5)
+        running = admission.enter(USER_A)
+        waiting = admission.enter(USER_B)
+        assert running[2] is None and not waiting[2].done()
+        assert admission.guild_running[10] == 1 and len(admission.waiting) == 1
+
+        admission.leave(running)
+        assert waiting[2].done() and not waiting[2].cancelled()
+        await admission.wait_turn(waiting)
+        assert admission.guild_running[10] == 1 and not admission.waiting
+
+        admission.leave(waiting)
+        assert not admission.guild_running and not admission.guild_waiting and not admission.user_load
+    asyncio.run(scenario())
+
+def test_rejects_when_the_user_or_the_line_is_full(vaultbot):
+    async def scenario():
+        admission = vaultbot.SearchAdmission(per_user=1, per_guild=1, queue_size=1)
+        admission.enter(USER_A)
+        with pytest.raises(vaultbot.SearchBusy):
+            admission.enter(USER_A)
+        admission.enter(USER_B)
+        with pytest.raises(vaultbot.SearchBusy):
+            admission.enter(USER_C)
+        assert admission.rejected == 2
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_leaves_the_line_without_freeing_a_running_slot(vaultbot):
+    async def scenario():
+        admission = vaultbot.SearchAdmission(per_user=2, per_guild=1, queue_size=5)
+        running = admission.enter(USER_A)
+        cancelled = admission.enter(USER_B)
+        behind = admission.enter(USER_C)
+
+        async def search(ticket):
+            try:
+                await admission.wait_turn(ticket)
+            finally:
+                admission.leave(ticket)
+
+        task = asyncio.ensure_future(search(cancelled))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert admission.guild_running[10] == 1 # Still just the running search
+        assert list(admission.waiting) == [behind] and admission.guild_waiting[10] == 1
+
+        admission.leave(running)
+        await admission.wait_turn(behind)
+        assert admission.guild_running[10] == 1 and not admission.waiting
+    asyncio.run(scenario())
+
+def test_running_search_finishing_skips_a_cancelled_waiter_still_in_line(vaultbot):
+    async def scenario():
+        admission = vaultbot.SearchAdmission(per_user=2, per_guild=1, queue_size=5)
+        running = admission.enter(USER_A)
+        cancelled = admission.enter(USER_B)
+        behind = admission.enter(USER_C)
+        cancelled[2].cancel() # Its task was cancelled, but its leave() has not run yet
+
+        admission.leave(running) # Must not set_result() on the cancelled future
+        assert behind[2].done() and not behind[2].cancelled()
+        admission.leave(cancelled)
+        assert admission.guild_running[10] == 1 and not admission.waiting and not admission.guild_waiting
+    asyncio.run(scenario())